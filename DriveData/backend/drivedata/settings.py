@@ -5,6 +5,8 @@ Django settings for drivedata project.
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -26,6 +28,12 @@ if RENDER_EXTERNAL_HOSTNAME:
 
 ALLOWED_HOSTS.append('drivedata-backend.onrender.com')
 
+# Render terminates TLS at its proxy and forwards plain HTTP with X-Forwarded-Proto.
+# Trust that header there, so absolute URLs built from the request (e.g. the
+# qr_code / qr_download_url links) are https. Only safe behind such a proxy.
+if os.environ.get('RENDER') or RENDER_EXTERNAL_HOSTNAME:
+    SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
 
 # Production settings for Render
 if not DEBUG:
@@ -109,6 +117,49 @@ DATABASES = {
     }
 }
 
+# Tuned SQLite profile for several gunicorn workers (on by default when DEBUG=False).
+# WAL lets readers run while one connection writes, busy_timeout makes a blocked
+# writer wait instead of failing with "database is locked", and IMMEDIATE
+# transactions take the write lock up front so two transactions can't deadlock
+# upgrading from read to write. Compare with `manage.py benchmark_sqlite`.
+SQLITE_TUNED = os.environ.get('SQLITE_TUNED', str(not DEBUG)) == 'True'
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # safe with WAL: a crash can lose the last commit, never corrupt
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', '5000')),  # milliseconds
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', str(128 * 1024 * 1024))),  # bytes
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', '20000')),  # negative = KiB per connection
+    'temp_store': 'MEMORY',
+}
+if SQLITE_TUNED:
+    DATABASES['default']['OPTIONS'] = {
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        'transaction_mode': 'IMMEDIATE',
+    }
+
+# Read replicas (vehicles/db_routing.py): comma-separated SQLite files kept in sync
+# with the primary, e.g. by `manage.py sync_sqlite_replicas` or a replication tool.
+# Scans, registry search/list and the dashboard read from them. A user who just
+# wrote reads from the primary for REPLICA_PIN_SECONDS.
+DATABASE_REPLICAS = [path.strip() for path in os.environ.get('DATABASE_REPLICAS', '').split(',') if path.strip()]
+DATABASE_REPLICA_ALIASES = []
+for number, replica_path in enumerate(DATABASE_REPLICAS, start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': replica_path,
+        # Read-only, and left in its own journal mode so the file can be swapped
+        # in place by the sync
+        'OPTIONS': {'init_command': 'PRAGMA query_only=ON'},
+        # Tests run against the primary only
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICA_ALIASES.append(alias)
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '10'))
+if DATABASE_REPLICA_ALIASES:
+    DATABASE_ROUTERS = ['vehicles.db_routing.ReadReplicaRouter']
+    MIDDLEWARE.append('vehicles.db_routing.PinPrimaryAfterWriteMiddleware')
+
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -145,6 +196,18 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 # Media files (Uploaded files)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Direct-to-storage photo uploads (vehicles/direct_uploads.py): clients get a signed
+# upload target, upload the file themselves and send back only the reference.
+# 'cloudinary' signs Cloudinary upload parameters; 'local' stores files under
+# MEDIA_ROOT/direct_uploads/ through an API endpoint, for offline development.
+DIRECT_UPLOAD_BACKEND = os.environ.get(
+    'DIRECT_UPLOAD_BACKEND', 'cloudinary' if os.environ.get('CLOUDINARY_API_SECRET') else 'local'
+)
+DIRECT_UPLOAD_TTL = int(os.environ.get('DIRECT_UPLOAD_TTL', '600'))  # seconds a target stays valid
+DIRECT_UPLOAD_MAX_BYTES = int(os.environ.get('DIRECT_UPLOAD_MAX_BYTES', str(10 * 1024 * 1024)))
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -181,6 +244,68 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.MultiPartParser',
         'rest_framework.parsers.FormParser',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'vehicles.pagination.CreatedAtCursorPagination',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', '50')),
+}
+
+# Hard cap on ?page_size= so a single request can't serialize the whole registry
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', '200'))
+
+# Caches
+# 'default' holds the read-your-writes pins of read replicas (vehicles/db_routing.py).
+# Local memory by default; with DATABASE_REPLICAS it must be shared by every worker,
+# so set DEFAULT_CACHE_BACKEND/DEFAULT_CACHE_LOCATION (e.g. Redis, or
+# django.core.cache.backends.filebased.FileBasedCache and a directory on one host).
+# 'scan' holds serialized QR scan responses (vehicles/scan_cache.py). Local memory by
+# default; set SCAN_CACHE_BACKEND/SCAN_CACHE_LOCATION to share it between workers,
+# e.g. django.core.cache.backends.redis.RedisCache and redis://127.0.0.1:6379/1
+SCAN_CACHE_TTL = int(os.environ.get('SCAN_CACHE_TTL', '300'))  # seconds
+SCAN_CACHE_BACKEND = os.environ.get('SCAN_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+DEFAULT_CACHE_BACKEND = os.environ.get('DEFAULT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': DEFAULT_CACHE_BACKEND,
+        'LOCATION': os.environ.get('DEFAULT_CACHE_LOCATION', ''),
+    },
+    'scan': {
+        'BACKEND': SCAN_CACHE_BACKEND,
+        'LOCATION': os.environ.get('SCAN_CACHE_LOCATION', 'vehicle-scan'),
+        'TIMEOUT': SCAN_CACHE_TTL,
+    },
+}
+if SCAN_CACHE_BACKEND.endswith('LocMemCache'):
+    # Size bound for the in-process LRU; shared backends enforce their own limits
+    CACHES['scan']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.environ.get('SCAN_CACHE_MAX_ENTRIES', '5000')),
+    }
+if DATABASE_REPLICA_ALIASES and DEFAULT_CACHE_BACKEND.endswith('LocMemCache'):
+    # A pin set by the worker that handled the write would be invisible to the others
+    raise ImproperlyConfigured(
+        'DATABASE_REPLICAS needs a cache shared by all workers for read-your-writes pins: '
+        'set DEFAULT_CACHE_BACKEND (and DEFAULT_CACHE_LOCATION) to a non-local-memory backend'
+    )
+
+# Background QR/logo generation (vehicles.AssetJob, `manage.py run_asset_worker`)
+# ASSET_JOBS_EAGER runs each job in-process right after commit, for setups without a worker
+ASSET_JOBS_EAGER = os.environ.get('ASSET_JOBS_EAGER', 'False') == 'True'
+ASSET_JOB_MAX_ATTEMPTS = int(os.environ.get('ASSET_JOB_MAX_ATTEMPTS', '5'))
+ASSET_JOB_RETRY_DELAY = int(os.environ.get('ASSET_JOB_RETRY_DELAY', '30'))  # seconds, doubled per attempt
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'vehicles': {
+            'handlers': ['console'],
+            'level': os.environ.get('VEHICLES_LOG_LEVEL', 'INFO'),
+        },
+    },
 }
 
 # Simple JWT settings
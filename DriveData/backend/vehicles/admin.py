@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Vehicle, Owner
+from .models import Vehicle, Owner, AssetJob
 
 @admin.register(Owner)
 class OwnerAdmin(admin.ModelAdmin):
@@ -9,7 +9,13 @@ class OwnerAdmin(admin.ModelAdmin):
 
 @admin.register(Vehicle)
 class VehicleAdmin(admin.ModelAdmin):
-    list_display = ['registration_number', 'make', 'model', 'year', 'owner', 'insurance_expiry', 'created_at']
+    list_display = ['registration_number', 'make', 'model', 'year', 'owner', 'insurance_expiry', 'asset_status', 'created_at']
     search_fields = ['registration_number', 'make', 'model', 'owner__name']
-    list_filter = ['make', 'year', 'fuel_type', 'created_at']
+    list_filter = ['make', 'year', 'fuel_type', 'asset_status', 'created_at']
     readonly_fields = ['qr_code', 'unique_id']
+
+@admin.register(AssetJob)
+class AssetJobAdmin(admin.ModelAdmin):
+    list_display = ['vehicle', 'status', 'attempts', 'max_attempts', 'run_after', 'updated_at']
+    list_filter = ['status']
+    readonly_fields = ['last_error', 'locked_at', 'created_at', 'updated_at']
@@ -1,14 +1,21 @@
 """
 Admin-only API views
 """
+from datetime import date
+
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from django.contrib.auth.models import User
+from django.db.models import Count
+from django.http import StreamingHttpResponse
 from .models import Vehicle
-from .serializers import VehicleSerializer
+from .read_serializers import VehicleRowSerializer, requested_fields, value_columns
 from .admin_permissions import IsAdmin
 from .admin_authentication import AdminJWTAuthentication
+from .pagination import CreatedAtCursorPagination, DateJoinedCursorPagination
+from .scan_cache import scan_cache_stats
 
 
 @api_view(['GET'])
@@ -17,26 +24,108 @@ from .admin_authentication import AdminJWTAuthentication
 def admin_get_all_vehicles(request):
     """
     GET /api/admin/vehicles/
-    List all vehicles in the system (admin only)
+    List all vehicles in the system (admin only), newest first.
+    Cursor paginated: follow 'next' / 'previous' to walk the registry.
+    'count' is only computed for the first page (null on cursor pages), so deep
+    pages stay a single range scan.
+    ?fields=a,b or ?exclude=a,b narrows each vehicle to those fields.
     """
-    vehicles = Vehicle.objects.all().select_related('owner').order_by('-created_at')
-    serializer = VehicleSerializer(vehicles, many=True, context={'request': request})
+    fields = requested_fields(request)
+    vehicles = Vehicle.objects.values(*value_columns(fields))
+    paginator = CreatedAtCursorPagination()
+    page = paginator.paginate_queryset(vehicles, request)
     
     return Response({
-        'count': vehicles.count(),
-        'vehicles': serializer.data
+        'count': Vehicle.objects.count() if paginator.position is None else None,
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
+        'vehicles': VehicleRowSerializer(fields, request).many(page)
     }, status=status.HTTP_200_OK)
 
 
+# Rows fetched from the database per round trip by the streaming export
+EXPORT_CHUNK_SIZE = 500
+
+
+@api_view(['GET'])
+@authentication_classes([AdminJWTAuthentication])
+@permission_classes([IsAdmin])
+def admin_export_vehicles(request):
+    """
+    GET /api/admin/vehicles/export/
+    Stream the whole registry as NDJSON (one VehicleSerializer object per line), oldest first.
+    Rows are read with a server-side iterator and serialized one at a time, so
+    memory stays flat however large the table is.
+    ?fields=a,b or ?exclude=a,b narrows each line to those fields.
+    """
+    fields = requested_fields(request)
+    vehicles = Vehicle.objects.order_by('id').values(*value_columns(fields))
+    serializer = VehicleRowSerializer(fields, request)
+    encoder = JSONEncoder(ensure_ascii=False)
+
+    def rows():
+        for row in vehicles.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield encoder.encode(serializer.to_representation(row)) + '\n'
+
+    response = StreamingHttpResponse(rows(), content_type='application/x-ndjson')
+    response['Content-Disposition'] = 'attachment; filename="vehicles.ndjson"'
+    return response
+
+
+# ?ordering= values accepted by the admin user list
+USER_ORDERINGS = ('date_joined', '-date_joined', 'vehicle_count', '-vehicle_count')
+
+
 @api_view(['GET'])
 @authentication_classes([AdminJWTAuthentication])
 @permission_classes([IsAdmin])
 def admin_get_all_users(request):
     """
     GET /api/admin/users/
-    List all users in the system (admin only)
+    List all users in the system (admin only), most recently joined first.
+    Cursor paginated: follow 'next' / 'previous' to walk the user list.
+
+    Optional query params:
+    - ordering: date_joined, -date_joined (default), vehicle_count, -vehicle_count
+    - min_vehicles / max_vehicles: bounds on the vehicle count
+    - joined_after / joined_before: YYYY-MM-DD, inclusive
+
+    Vehicle counts come from one grouped query, so a page costs the same number
+    of queries however many users it holds. The cursor holds both the ordering
+    column and id, so long runs of equal vehicle counts page like any other.
+    'count' is only computed for the first page (null on cursor pages): it re-runs
+    the grouped query over every matching user.
     """
-    users = User.objects.all().order_by('-date_joined')
+    params = request.query_params
+    ordering = params.get('ordering', '-date_joined')
+    if ordering not in USER_ORDERINGS:
+        return Response(
+            {'error': f"ordering must be one of {', '.join(USER_ORDERINGS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    users = User.objects.only(
+        'id', 'username', 'email', 'first_name', 'last_name', 'date_joined', 'is_active'
+    ).annotate(vehicle_count=Count('vehicles'))
+    try:
+        if params.get('min_vehicles'):
+            users = users.filter(vehicle_count__gte=int(params['min_vehicles']))
+        if params.get('max_vehicles'):
+            users = users.filter(vehicle_count__lte=int(params['max_vehicles']))
+        if params.get('joined_after'):
+            users = users.filter(date_joined__date__gte=date.fromisoformat(params['joined_after']))
+        if params.get('joined_before'):
+            users = users.filter(date_joined__date__lte=date.fromisoformat(params['joined_before']))
+    except ValueError:
+        return Response(
+            {'error': 'min_vehicles/max_vehicles must be integers and joined_after/joined_before YYYY-MM-DD dates'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    paginator = DateJoinedCursorPagination()
+    # Tie-breaker in the same direction as the requested column
+    paginator.ordering = (ordering, '-id' if ordering.startswith('-') else 'id')
+    page = paginator.paginate_queryset(users, request)
     
     users_data = [{
         'id': user.id,
@@ -46,11 +135,13 @@ def admin_get_all_users(request):
         'last_name': user.last_name,
         'date_joined': user.date_joined,
         'is_active': user.is_active,
-        'vehicle_count': user.vehicles.count()
-    } for user in users]
+        'vehicle_count': user.vehicle_count
+    } for user in page]
     
     return Response({
-        'count': len(users_data),
+        'count': users.count() if paginator.position is None else None,
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
         'users': users_data
     }, status=status.HTTP_200_OK)
 
@@ -138,16 +229,23 @@ def admin_dashboard_stats(request):
     """
     total_vehicles = Vehicle.objects.count()
     total_users = User.objects.count()
-    recent_vehicles = Vehicle.objects.all().select_related('owner').order_by('-created_at')[:5]
+    recent_vehicles = Vehicle.objects.order_by('-created_at').values(*value_columns())[:5]
     
-    recent_vehicles_data = VehicleSerializer(
-        recent_vehicles, 
-        many=True, 
-        context={'request': request}
-    ).data
+    recent_vehicles_data = VehicleRowSerializer(request=request).many(recent_vehicles)
     
     return Response({
         'total_vehicles': total_vehicles,
         'total_users': total_users,
         'recent_vehicles': recent_vehicles_data
     }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@authentication_classes([AdminJWTAuthentication])
+@permission_classes([IsAdmin])
+def admin_scan_cache_stats(request):
+    """
+    GET /api/admin/scan-cache/
+    Hit/miss counters of the QR scan cache (admin only)
+    """
+    return Response(scan_cache_stats(), status=status.HTTP_200_OK)
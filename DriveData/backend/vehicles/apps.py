@@ -8,6 +8,8 @@ class VehiclesConfig(AppConfig):
 
     def ready(self):
         post_migrate.connect(create_admin_user, sender=self)
+        # Register the scan cache invalidation and media reference receivers
+        from . import media_assets, scan_cache  # noqa: F401
 
 def create_admin_user(sender, **kwargs):
     User = get_user_model()
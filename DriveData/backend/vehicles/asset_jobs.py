@@ -0,0 +1,106 @@
+"""
+Processing side of the AssetJob queue
+
+Jobs are claimed with a conditional UPDATE (status pending -> running), which is
+atomic on every database Django supports, so several workers - or a worker and
+an eager in-process run - never process the same job twice.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AssetJob, Vehicle
+from .scan_cache import invalidate_scan_payload
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempts):
+    """Exponential backoff between attempts, capped at one hour"""
+    base = settings.ASSET_JOB_RETRY_DELAY
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), 3600))
+
+
+def claim_job(job_id):
+    """Atomically move one pending job to running; returns the job or None if someone else got it"""
+    now = timezone.now()
+    claimed = AssetJob.objects.filter(pk=job_id, status=AssetJob.PENDING).update(
+        status=AssetJob.RUNNING,
+        locked_at=now,
+        attempts=F('attempts') + 1,
+        updated_at=now,
+    )
+    if not claimed:
+        return None
+    return AssetJob.objects.select_related('vehicle').get(pk=job_id)
+
+
+def claim_next_job():
+    """Claim the oldest job that is due, or return None when the queue is empty"""
+    due = (
+        AssetJob.objects
+        .filter(status=AssetJob.PENDING, run_after__lte=timezone.now())
+        .order_by('run_after', 'id')
+        .values_list('pk', flat=True)[:10]
+    )
+    for job_id in due:
+        job = claim_job(job_id)
+        if job is not None:
+            return job
+    return None
+
+
+def run_job(job):
+    """Generate the vehicle's assets for a claimed job; returns True on success"""
+    vehicle = job.vehicle
+    try:
+        vehicle.generate_assets()
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = AssetJob.FAILED
+            # update() sends no post_save: bump updated_at so cached scan payloads
+            # elsewhere are revalidated, and drop this process's entry
+            Vehicle.objects.filter(pk=vehicle.pk).update(
+                asset_status=Vehicle.ASSET_FAILED, updated_at=timezone.now()
+            )
+            invalidate_scan_payload(vehicle.unique_id)
+            logger.error("Asset job %s failed permanently for %s", job.pk, vehicle.registration_number)
+        else:
+            job.status = AssetJob.PENDING
+            job.run_after = timezone.now() + retry_delay(job.attempts)
+            logger.warning(
+                "Asset job %s failed for %s (attempt %s/%s), retrying at %s",
+                job.pk, vehicle.registration_number, job.attempts, job.max_attempts, job.run_after,
+            )
+        job.locked_at = None
+        job.save(update_fields=['status', 'run_after', 'locked_at', 'last_error', 'updated_at'])
+        return False
+
+    job.status = AssetJob.DONE
+    job.locked_at = None
+    job.last_error = ''
+    job.save(update_fields=['status', 'locked_at', 'last_error', 'updated_at'])
+    logger.info("Asset job %s done for %s", job.pk, vehicle.registration_number)
+    return True
+
+
+def run_job_by_id(job_id):
+    """Claim and run a specific job (used for eager, in-process execution)"""
+    job = claim_job(job_id)
+    if job is not None:
+        run_job(job)
+
+
+def requeue_stale_jobs(stale_after):
+    """Return jobs whose worker died mid-run (locked longer than stale_after) to the queue"""
+    cutoff = timezone.now() - stale_after
+    return AssetJob.objects.filter(status=AssetJob.RUNNING, locked_at__lt=cutoff).update(
+        status=AssetJob.PENDING,
+        locked_at=None,
+        updated_at=timezone.now(),
+    )
@@ -0,0 +1,201 @@
+"""
+Image rendering for vehicle QR codes and logos
+
+Kept free of model and storage code so the same renderers can be used by
+Vehicle.generate_logo(), the QR code endpoint, the asset worker and commands.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from io import BytesIO
+
+import qrcode
+from PIL import Image, ImageDraw
+
+# Theme blue used for the QR modules (#1e40af)
+QR_FILL_COLOR = (30, 64, 175)
+QR_BACK_COLOR = (255, 255, 255)
+
+# Edge length of the QR code pasted into the logo, in pixels
+LOGO_QR_SIZE = 300
+
+# Logo canvas (wider than tall for a better car shape)
+LOGO_WIDTH, LOGO_HEIGHT = 1200, 600
+
+# The car artwork never changes, so it is drawn once per process and copied
+_logo_template = None
+_logo_template_lock = threading.Lock()
+
+
+def build_qr(data, border=4):
+    """Return a fitted QRCode for data (high error correction, smallest version that fits)"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        border=border,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def render_qr_image(data, size=LOGO_QR_SIZE):
+    """
+    Render data as an RGB QR image of exactly size x size pixels.
+
+    The module size is the largest whole number of pixels that fits, and the
+    leftover pixels widen the white quiet zone, so the image never needs
+    resampling (no blurred module edges, no LANCZOS pass).
+    """
+    qr = build_qr(data)
+    modules = qr.modules_count + 2 * qr.border
+    qr.box_size = max(size // modules, 1)
+    qr_image = qr.make_image(fill_color=QR_FILL_COLOR, back_color=QR_BACK_COLOR).get_image().convert('RGB')
+
+    if qr_image.size == (size, size):
+        return qr_image
+    canvas = Image.new('RGB', (size, size), QR_BACK_COLOR)
+    offset = (size - qr_image.size[0]) // 2
+    canvas.paste(qr_image, (offset, offset))
+    return canvas
+
+
+def render_qr_svg(data):
+    """
+    Render data as a compact SVG QR code in a viewBox of one unit per module, so
+    it scales without blurring. Each row of modules is one stroked line: an
+    absolute move to its first dark run, then relative gaps and runs.
+    """
+    qr = build_qr(data)
+    fill = '#%02x%02x%02x' % QR_FILL_COLOR
+    back = '#%02x%02x%02x' % QR_BACK_COLOR
+    edge = qr.modules_count + 2 * qr.border
+    commands = []
+    for y, row in enumerate(qr.modules):
+        x = 0
+        pen = None
+        while x < len(row):
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < len(row) and row[x]:
+                x += 1
+            if pen is None:
+                commands.append(f'M{start + qr.border} {y + qr.border}.5')
+            else:
+                commands.append(f'm{start - pen} 0')
+            commands.append(f'h{x - start}')
+            pen = x
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {edge} {edge}" shape-rendering="crispEdges">'
+        f'<rect width="{edge}" height="{edge}" fill="{back}"/>'
+        f'<path stroke="{fill}" d="{"".join(commands)}"/></svg>'
+    ).encode()
+
+
+def render_qr_png(data, size):
+    """Render data as a size x size PNG QR code (two-colour palette)"""
+    qr_image = render_qr_image(data, size).quantize(colors=2)
+    buffer = BytesIO()
+    qr_image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def draw_logo_template():
+    """Draw the static part of the logo: SUV silhouette, windows, accent and wheels"""
+    # Create base image with white background
+    logo_img = Image.new('RGB', (LOGO_WIDTH, LOGO_HEIGHT), (255, 255, 255))
+    draw = ImageDraw.Draw(logo_img)
+
+    # Define car silhouette coordinates (SUV shape)
+    car_color = (30, 30, 30)  # Very dark gray/black
+    blue_accent = (30, 64, 175)  # Blue color matching theme (#1e40af)
+
+    # Main car body - simplified SUV silhouette
+    car_body = [
+        # Front hood
+        (200, 200), (350, 150), (450, 130),
+        # Windshield and roof
+        (550, 130), (700, 130), (800, 150), (950, 200),
+        # Roof line
+        (950, 200), (950, 280), (920, 310),
+        # Back door/window
+        (920, 310), (920, 380), (880, 410),
+        # Bottom back
+        (880, 480), (820, 500), (780, 500), (750, 480),
+        # Between wheels
+        (750, 480), (450, 480), (420, 500), (380, 500), (340, 480),
+        # Bottom front
+        (340, 480), (280, 410), (280, 380), (240, 310),
+        # Front
+        (200, 280), (200, 200)
+    ]
+    draw.polygon(car_body, fill=car_color)
+
+    # Windows (white areas)
+    # Front windshield
+    front_window = [(360, 170), (520, 150), (500, 240), (340, 260)]
+    draw.polygon(front_window, fill=(255, 255, 255))
+
+    # Rear window
+    rear_window = [(730, 150), (890, 170), (870, 260), (710, 240)]
+    draw.polygon(rear_window, fill=(255, 255, 255))
+
+    # Blue accent on the side (door area)
+    side_accent = [(950, 220), (1050, 280), (1050, 360), (950, 360)]
+    draw.polygon(side_accent, fill=blue_accent)
+
+    # Front wheel
+    wheel_y = 440
+    draw.ellipse([280, wheel_y, 400, wheel_y + 120], fill=car_color)
+    draw.ellipse([310, wheel_y + 30, 370, wheel_y + 90], fill=(255, 255, 255))
+    draw.ellipse([325, wheel_y + 45, 355, wheel_y + 75], fill=car_color)
+
+    # Rear wheel
+    draw.ellipse([780, wheel_y, 900, wheel_y + 120], fill=car_color)
+    draw.ellipse([810, wheel_y + 30, 870, wheel_y + 90], fill=(255, 255, 255))
+    draw.ellipse([825, wheel_y + 45, 855, wheel_y + 75], fill=car_color)
+
+    return logo_img
+
+
+def get_logo_template():
+    """The cached logo artwork; drawn on first use (thread-safe). Never mutate it - copy it."""
+    global _logo_template
+    if _logo_template is None:
+        with _logo_template_lock:
+            if _logo_template is None:
+                _logo_template = draw_logo_template()
+    return _logo_template
+
+
+def warm_logo_template():
+    """Draw the logo template ahead of the first job (called at worker start)"""
+    get_logo_template()
+
+
+def render_logo_image(qr_image):
+    """Compose a vehicle logo: a copy of the cached artwork with qr_image pasted on the car"""
+    logo_img = get_logo_template().copy()
+
+    # Position QR code in the center/door area of the car
+    qr_x = (LOGO_WIDTH - qr_image.size[0]) // 2
+    qr_y = (LOGO_HEIGHT - qr_image.size[1]) // 2 + 30
+
+    # Paste QR code directly (it already has white background)
+    logo_img.paste(qr_image, (qr_x, qr_y))
+    return logo_img
+
+
+@contextmanager
+def timed_stage(timings, stage):
+    """Add the wall time of the block to timings[stage] (no-op when timings is None)"""
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
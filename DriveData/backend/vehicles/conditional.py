@@ -0,0 +1,62 @@
+"""
+Conditional GET (ETag / Last-Modified) for API views
+
+The dashboard polls the same endpoints over and over. Instead of re-serializing
+an unchanged response, a view decorated with @conditional_get first runs a cheap
+validator query, usually MAX(updated_at) and COUNT(*) over the rows the response
+is built from. If the client's If-None-Match / If-Modified-Since still matches,
+it answers 304 Not Modified without calling the view at all.
+
+Validators run after DRF authentication and permission checks, so they may use
+request.user and the answer is never shared between users.
+"""
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.request import Request
+
+
+def make_etag(*parts):
+    """Strong ETag from the string form of every part"""
+    digest = hashlib.blake2b('|'.join(str(part) for part in parts).encode(), digest_size=16)
+    return quote_etag(digest.hexdigest())
+
+
+def conditional_get(get_validators):
+    """
+    Decorator for DRF GET handlers: APIView methods and @api_view functions.
+
+    get_validators(request, *args, **kwargs) returns (etag_parts, last_modified).
+    etag_parts is a tuple hashed into the ETag, and last_modified is a datetime
+    or None. Return None to skip conditional handling, e.g. when the object
+    does not exist, so the view produces its usual error.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(*args, **kwargs):
+            # (self, request, ...) on view methods, (request, ...) on function views
+            position = 0 if isinstance(args[0], Request) else 1
+            request = args[position]
+
+            validators = get_validators(request, *args[position + 1:], **kwargs)
+            if validators is None:
+                return view_func(*args, **kwargs)
+            etag_parts, last_modified = validators
+            etag = make_etag(*etag_parts)
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = view_func(*args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                if timestamp is not None:
+                    response['Last-Modified'] = http_date(timestamp)
+                # Per-user data: browsers may keep it but must revalidate every time
+                patch_cache_control(response, private=True, no_cache=True)
+                patch_vary_headers(response, ['Authorization'])
+            return response
+        return wrapper
+    return decorator
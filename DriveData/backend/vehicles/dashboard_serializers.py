@@ -4,7 +4,8 @@ Provides data formatting and expiry status calculation for dashboard widgets
 """
 
 from rest_framework import serializers
-from .models import Vehicle
+from .models import Vehicle, expiry_status_for
+from .qr_codes import qr_code_url
 from datetime import date, timedelta
 
 
@@ -55,18 +56,7 @@ class ExpiryAlertSerializer(serializers.ModelSerializer):
         - Yellow: 1 to 30 days remaining
         - Red: Expired (0 or negative days)
         """
-        if not expiry_date:
-            return 'red'
-        
-        today = date.today()
-        days_remaining = (expiry_date - today).days
-        
-        if days_remaining > 30:
-            return 'green'
-        elif days_remaining >= 1:
-            return 'yellow'
-        else:
-            return 'red'
+        return expiry_status_for(expiry_date)
     
     def get_days_remaining(self, expiry_date):
         """Calculate days remaining until expiry"""
@@ -134,15 +124,14 @@ class MyVehicleSerializer(serializers.ModelSerializer):
         ]
 
     def get_qr_status(self, obj):
-        """Check if QR code exists - returns 'Active' or 'Inactive'"""
-        return 'Active' if obj.qr_code else 'Inactive'
+        """Every vehicle's QR code is rendered on request, so it is always 'Active'"""
+        return 'Active'
     
     def get_qr_download_url(self, obj):
-        """Get full URL for QR code download"""
-        if obj.qr_code:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.qr_code.url)
+        """Get full URL for QR code download (PNG, rendered on request)"""
+        request = self.context.get('request')
+        if request:
+            return qr_code_url(obj.unique_id, request, image_format='png')
         return None
     
     def get_logo_download_url(self, obj):
@@ -1,14 +1,19 @@
 """
 Dashboard Views for DriveData
 Provides API endpoints for dashboard statistics, expiry alerts, and vehicle lists
+All of them are read-only and are served from a read replica when one is configured
+Conditional GETs are answered with 304 while nothing in scope has changed
 """
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from datetime import date, timedelta
-from django.db.models import Q
+from django.db.models import Count, Max, Q
 from .models import Vehicle
+from .db_routing import ReadReplicaMixin
+from .conditional import conditional_get
+from .pagination import CreatedAtCursorPagination, ExpiryCursorPagination
 from .dashboard_serializers import (
     DashboardStatsSerializer,
     ExpiryAlertSerializer,
@@ -16,7 +21,25 @@ from .dashboard_serializers import (
 )
 
 
-class DashboardStatsView(APIView):
+def dashboard_validators(request, *args, **kwargs):
+    """
+    Conditional GET validators shared by the dashboard views: who is asking, which
+    page (path + query string), today's date (statuses and days remaining depend on
+    it) and MAX(updated_at) / COUNT(*) of the vehicles in scope. The last two come
+    from one query on the (owner, updated_at) index.
+    """
+    if request.user.is_staff:
+        vehicles = Vehicle.objects.all()
+    else:
+        vehicles = Vehicle.objects.filter(owner=request.user)
+    state = vehicles.aggregate(last_updated=Max('updated_at'), count=Count('id'))
+    return (
+        request.user.pk, request.user.is_staff, request.get_full_path(), date.today(),
+        state['last_updated'], state['count'],
+    ), None
+
+
+class DashboardStatsView(ReadReplicaMixin, APIView):
     """
     GET /api/dashboard/stats/
     
@@ -25,8 +48,13 @@ class DashboardStatsView(APIView):
     - Vehicles with documents expiring soon (within 30 days)
     - Vehicles with expired documents
     - Active QR codes count
+
+    Query budget: 2 queries for a 200 (the validator's index-only MAX/COUNT, then
+    the counters) and 1 for a 304. The validator is kept separate from the
+    counters so that polling with an unchanged ETag never reads the rows.
     """
     
+    @conditional_get(dashboard_validators)
     def get(self, request):
         # Calculate date thresholds
         today = date.today()
@@ -38,38 +66,27 @@ class DashboardStatsView(APIView):
         else:
             user_vehicles = Vehicle.objects.filter(owner=request.user)
         
-        # Total vehicles
-        total_vehicles = user_vehicles.count()
-        
-        # Count vehicles with expiring documents (within 30 days)
-        # Check both insurance and pollution certificate
-        expiring_soon = user_vehicles.filter(
-            Q(insurance_expiry__lte=expiry_threshold, insurance_expiry__gt=today) |
-            Q(pollution_certificate_expiry__lte=expiry_threshold, pollution_certificate_expiry__gt=today)
-        ).distinct().count()
-        
-        # Count vehicles with expired documents
-        expired = user_vehicles.filter(
-            Q(insurance_expiry__lt=today) |
-            Q(pollution_certificate_expiry__lt=today)
-        ).distinct().count()
-        
-        # Count vehicles with active QR codes
-        active_qr = user_vehicles.exclude(qr_code='').count()
-        
-        # Prepare response data
-        stats = {
-            'total_vehicles': total_vehicles,
-            'expiring_soon_count': expiring_soon,
-            'expired_count': expired,
-            'active_qr_count': active_qr,
-        }
+        # All four counters in a single aggregate query (conditional COUNTs)
+        stats = user_vehicles.aggregate(
+            # Total vehicles
+            total_vehicles=Count('id'),
+            # Vehicles with expiring documents (within 30 days)
+            # Check both insurance and pollution certificate
+            expiring_soon_count=Count('id', filter=(
+                Q(insurance_expiry__lte=expiry_threshold, insurance_expiry__gt=today) |
+                Q(pollution_certificate_expiry__lte=expiry_threshold, pollution_certificate_expiry__gt=today)
+            )),
+            # Vehicles with expired documents (the earlier expiry is in the past)
+            expired_count=Count('id', filter=Q(next_expiry_date__lt=today)),
+            # QR codes are rendered on request, so every vehicle has an active one
+            active_qr_count=Count('id'),
+        )
         
         serializer = DashboardStatsSerializer(stats)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class ExpiryAlertsView(APIView):
+class ExpiryAlertsView(ReadReplicaMixin, APIView):
     """
     GET /api/dashboard/expiries/
     
@@ -80,47 +97,73 @@ class ExpiryAlertsView(APIView):
     - Pollution certificate expiry date and status
     - Overall status (red/yellow/green)
     - Days remaining for each document
+
+    Cursor paginated, earliest expiry (of either document) first.
+    Optional ?status=red|yellow|green filters on the stored expiry status.
     """
+    pagination_class = ExpiryCursorPagination
     
+    @conditional_get(dashboard_validators)
     def get(self, request):
-        # Get user's vehicles ordered by earliest expiry date first (admin users see all vehicles)
+        # Get user's vehicles (admin users see all vehicles); the paginator orders
+        # them by earliest expiry date first
         if request.user.is_staff:
-            vehicles = Vehicle.objects.all().order_by('insurance_expiry')
+            vehicles = Vehicle.objects.all()
         else:
-            vehicles = Vehicle.objects.filter(owner=request.user).order_by('insurance_expiry')
+            vehicles = Vehicle.objects.filter(owner=request.user)
+        
+        expiry_status = request.query_params.get('status')
+        if expiry_status:
+            if expiry_status not in dict(Vehicle.EXPIRY_STATUS_CHOICES):
+                return Response(
+                    {'error': 'status must be one of red, yellow, green'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            vehicles = vehicles.filter(expiry_status=expiry_status)
+        
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(vehicles, request, view=self)
         
         # Serialize the data (status calculation happens in serializer)
-        serializer = ExpiryAlertSerializer(vehicles, many=True, context={'request': request})
+        serializer = ExpiryAlertSerializer(page, many=True, context={'request': request})
         
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return paginator.get_paginated_response(serializer.data)
 
 
-class MyVehiclesView(APIView):
+class MyVehiclesView(ReadReplicaMixin, APIView):
     """
     GET /api/dashboard/my-vehicles/
     
     Returns compact list of user's vehicles with:
     - Vehicle number and make/model
-    - QR code status (Active/Inactive)
+    - QR code status (always Active: QR codes are rendered on request)
     - QR code download URL
     - Logo download URL
     - Public page URL for sharing
+
+    Cursor paginated, most recently created first.
     """
+    pagination_class = CreatedAtCursorPagination
     
+    @conditional_get(dashboard_validators)
     def get(self, request):
-        # Get user's vehicles ordered by most recently created (admin users see all vehicles)
+        # Get user's vehicles (admin users see all vehicles); the paginator orders
+        # them by most recently created
         if request.user.is_staff:
-            vehicles = Vehicle.objects.all().order_by('-created_at')
+            vehicles = Vehicle.objects.all()
         else:
-            vehicles = Vehicle.objects.filter(owner=request.user).order_by('-created_at')
+            vehicles = Vehicle.objects.filter(owner=request.user)
+        
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(vehicles, request, view=self)
         
         # Serialize with request context for building absolute URLs
-        serializer = MyVehicleSerializer(vehicles, many=True, context={'request': request})
+        serializer = MyVehicleSerializer(page, many=True, context={'request': request})
         
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return paginator.get_paginated_response(serializer.data)
 
 
-class DashboardAlertsSummaryView(APIView):
+class DashboardAlertsSummaryView(ReadReplicaMixin, APIView):
     """
     GET /api/dashboard/alerts-summary/
     
@@ -130,6 +173,7 @@ class DashboardAlertsSummaryView(APIView):
     - Already expired vehicles
     """
     
+    @conditional_get(dashboard_validators)
     def get(self, request):
         today = date.today()
         week_from_now = today + timedelta(days=7)
@@ -141,32 +185,53 @@ class DashboardAlertsSummaryView(APIView):
         else:
             user_vehicles = Vehicle.objects.filter(owner=request.user)
         
-        # Vehicles expiring within a week
-        expiring_this_week = user_vehicles.filter(
-            Q(insurance_expiry__lte=week_from_now, insurance_expiry__gt=today) |
-            Q(pollution_certificate_expiry__lte=week_from_now, pollution_certificate_expiry__gt=today)
-        ).distinct()
-        
-        # Vehicles expiring within a month (but not this week)
-        expiring_this_month = user_vehicles.filter(
-            Q(insurance_expiry__lte=month_from_now, insurance_expiry__gt=week_from_now) |
-            Q(pollution_certificate_expiry__lte=month_from_now, pollution_certificate_expiry__gt=week_from_now)
-        ).distinct()
-        
-        # Already expired vehicles
-        already_expired = user_vehicles.filter(
-            Q(insurance_expiry__lt=today) |
-            Q(pollution_certificate_expiry__lt=today)
-        ).distinct()
+        # One query for every vehicle that can land in any bucket (some document
+        # expires within a month or already has): a single range scan on the
+        # (owner, next_expiry_date) index, reading only the columns the alert rows need.
+        # Rows come back in index order, so the database needs no sort step.
+        candidates = user_vehicles.filter(
+            next_expiry_date__lte=month_from_now
+        ).order_by('next_expiry_date', 'id').only(
+            'id', 'registration_number', 'insurance_expiry', 'pollution_certificate_expiry', 'created_at'
+        )
+        
+        def expires_between(vehicle, after, until):
+            """True if either document expires in the (after, until] window"""
+            return any(
+                after < expiry <= until
+                for expiry in (vehicle.insurance_expiry, vehicle.pollution_certificate_expiry)
+            )
+        
+        expiring_this_week = []
+        expiring_this_month = []
+        already_expired = []
+        
+        # Serialize each vehicle once and sort the rows into buckets in a single pass.
+        # A vehicle can be in several buckets (e.g. insurance expired, pollution
+        # certificate due this week), exactly as with the per-bucket filters.
+        # The buckets keep the model's default order (newest first), as before the
+        # single query; sorting the month's candidates here is cheap
+        vehicles = sorted(candidates, key=lambda vehicle: (vehicle.created_at, vehicle.id), reverse=True)
+        rows = ExpiryAlertSerializer(vehicles, many=True, context={'request': request}).data
+        for vehicle, row in zip(vehicles, rows):
+            # Vehicles expiring within a week
+            if expires_between(vehicle, today, week_from_now):
+                expiring_this_week.append(row)
+            # Vehicles expiring within a month (but not this week)
+            if expires_between(vehicle, week_from_now, month_from_now):
+                expiring_this_month.append(row)
+            # Already expired vehicles
+            if vehicle.insurance_expiry < today or vehicle.pollution_certificate_expiry < today:
+                already_expired.append(row)
         
         summary = {
-            'expiring_this_week': ExpiryAlertSerializer(expiring_this_week, many=True, context={'request': request}).data,
-            'expiring_this_month': ExpiryAlertSerializer(expiring_this_month, many=True, context={'request': request}).data,
-            'already_expired': ExpiryAlertSerializer(already_expired, many=True, context={'request': request}).data,
+            'expiring_this_week': expiring_this_week,
+            'expiring_this_month': expiring_this_month,
+            'already_expired': already_expired,
             'counts': {
-                'this_week': expiring_this_week.count(),
-                'this_month': expiring_this_month.count(),
-                'expired': already_expired.count(),
+                'this_week': len(expiring_this_week),
+                'this_month': len(expiring_this_month),
+                'expired': len(already_expired),
             }
         }
         
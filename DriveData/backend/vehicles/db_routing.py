@@ -0,0 +1,117 @@
+"""
+Read-replica routing for read-heavy endpoints
+
+Replicas are extra DATABASES aliases listed in settings.DATABASE_REPLICA_ALIASES
+(built from DATABASE_REPLICAS). Writes and migrations always go to 'default'.
+Reads go to a random replica only while a view that opted in is handling a
+request (ReadReplicaMixin), so admin, auth and background code keep reading
+the primary.
+
+Read-your-writes: after a user's successful write request,
+PinPrimaryAfterWriteMiddleware pins that user to the primary for
+REPLICA_PIN_SECONDS, which should cover the replication lag. The pin lives in
+the 'default' cache, which must be shared by every worker: settings refuse
+DATABASE_REPLICAS with the local-memory backend (DEFAULT_CACHE_BACKEND).
+Scans are anonymous, so they cannot be pinned. A scan cache miss that lands
+within the replication lag of a write can cache the old payload until
+SCAN_CACHE_TTL expires.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICA_ALIASES', [])
+
+
+def pin_key(user_id):
+    return f'db-pin-primary:{user_id}'
+
+
+def pin_to_primary(user):
+    """Send this user's reads to the primary for the next REPLICA_PIN_SECONDS"""
+    if user is not None and user.is_authenticated:
+        cache.set(pin_key(user.pk), True, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user):
+    return user is not None and user.is_authenticated and bool(cache.get(pin_key(user.pk)))
+
+
+@contextmanager
+def use_replica():
+    """Route reads inside the block to a replica (no-op without replicas)"""
+    token = _read_from_replica.set(True)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+class ReadReplicaRouter:
+    """Database router: replica reads on request, everything else on 'default'"""
+
+    def db_for_read(self, model, **hints):
+        aliases = replica_aliases()
+        if not aliases or not _read_from_replica.get():
+            return DEFAULT_DB_ALIAS
+        # Reads inside a transaction on the primary must see its uncommitted writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary, never from migrate
+        return db not in replica_aliases()
+
+
+class ReadReplicaMixin:
+    """
+    API view mixin: serve read requests from a replica unless the user wrote recently.
+    Override use_read_replica() to add read-only POST actions.
+    """
+
+    def use_read_replica(self, request):
+        return request.method in SAFE_METHODS
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Runs after authentication, so the pin can be checked per user
+        if replica_aliases() and self.use_read_replica(request) and not is_pinned_to_primary(request.user):
+            self._replica_token = _read_from_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _read_from_replica.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class PinPrimaryAfterWriteMiddleware:
+    """Pin users to the primary after a successful POST/PUT/PATCH/DELETE"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # DRF copies the token-authenticated user onto the Django request
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(getattr(request, 'user', None))
+        return response
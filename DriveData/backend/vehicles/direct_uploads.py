@@ -0,0 +1,175 @@
+"""
+Direct-to-storage photo uploads
+
+Instead of sending photos through the API (and the API re-uploading them),
+clients ask POST /api/uploads/sign/ for upload targets, upload each file
+straight to storage and then send VehicleSerializer only the returned
+reference ("direct:<signed token>") in place of the file:
+
+    1. POST /api/uploads/sign/            {"content_type": "image/jpeg", "count": 2}
+    2. POST <target.url> multipart        target.fields + file=<photo>
+    3. POST /api/vehicles/ (JSON)         {"front_photo": "<target.reference>", ...}
+
+With the cloudinary backend, step 3 also carries what Cloudinary answered in
+step 2, so the API can tell that the file was really uploaded:
+
+    {"front_photo": {"reference": "<target.reference>",
+                     "public_id": ..., "version": ..., "signature": ...}}
+
+A reference is signed with SECRET_KEY and names the user it was issued to, so
+it can't be forged or used by someone else. Backends (DIRECT_UPLOAD_BACKEND):
+  - cloudinary: signed Cloudinary upload parameters; the file goes straight to
+    Cloudinary (Cloudinary accepts the signature for an hour at most). The
+    upload response is signed by Cloudinary with the API secret; it is verified
+    and the versioned public id is stored
+  - local: an API endpoint that stores the file under MEDIA_ROOT, so the flow can
+    be exercised offline; it is a stand-in, not meant for production traffic
+"""
+import time
+import uuid
+
+import cloudinary
+from cloudinary.utils import api_sign_request, cloudinary_api_url, verify_api_response_signature
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import FileSystemStorage
+from django.urls import reverse
+
+# Prefix that marks a photo field value as a direct upload reference
+DIRECT_UPLOAD_PREFIX = 'direct:'
+SIGNING_SALT = 'vehicles.direct_uploads'
+TARGET_SIGNING_SALT = 'vehicles.direct_uploads.target'
+
+# References can be submitted for a day; upload targets expire after DIRECT_UPLOAD_TTL
+REFERENCE_MAX_AGE = 24 * 3600
+
+# Image types a target may be issued for
+ALLOWED_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/avif', 'image/heic')
+
+# Where the files end up
+CLOUDINARY_FOLDER = 'vehicle_photos/direct'
+LOCAL_DIRECTORY = 'direct_uploads'
+
+
+class DirectUploadError(Exception):
+    """A reference or an upload that can't be accepted; the message is safe to show"""
+
+
+def local_storage():
+    return FileSystemStorage(
+        location=settings.MEDIA_ROOT / LOCAL_DIRECTORY,
+        base_url=f'{settings.MEDIA_URL}{LOCAL_DIRECTORY}/',
+    )
+
+
+def issue_upload_target(request, content_type):
+    """Create one upload target for the requesting user"""
+    name = uuid.uuid4().hex
+    expires_at = int(time.time()) + settings.DIRECT_UPLOAD_TTL
+
+    if settings.DIRECT_UPLOAD_BACKEND == 'cloudinary':
+        public_id = f'{CLOUDINARY_FOLDER}/{name}'
+        config = cloudinary.config()
+        params = {
+            'public_id': public_id,
+            'timestamp': int(time.time()),
+            'allowed_formats': 'jpg,png,webp,avif,heic',
+        }
+        params['signature'] = api_sign_request(params, config.api_secret)
+        params['api_key'] = config.api_key
+        target = {'url': cloudinary_api_url('upload', resource_type='image'), 'fields': params}
+        # Completed with the version of the upload once its response is verified
+        value = f'image/upload/{public_id}'
+    else:
+        # No extension: CloudinaryField would split it off the stored URL as a format
+        upload_token = signing.dumps(
+            {'name': name, 'content_type': content_type, 'expires_at': expires_at}, salt=TARGET_SIGNING_SALT
+        )
+        target = {
+            'url': request.build_absolute_uri(reverse('direct-upload-local', args=[upload_token])),
+            'fields': {},
+        }
+        # A stored http(s) URL is returned as-is by CloudinaryResource.url
+        value = request.build_absolute_uri(local_storage().url(name))
+
+    reference = DIRECT_UPLOAD_PREFIX + signing.dumps(
+        {'user': request.user.pk, 'backend': settings.DIRECT_UPLOAD_BACKEND, 'name': name, 'value': value},
+        salt=SIGNING_SALT,
+    )
+    return {
+        'method': 'POST',
+        'url': target['url'],
+        'fields': target['fields'],
+        'file_field': 'file',
+        'expires_at': expires_at,
+        'reference': reference,
+    }
+
+
+def store_local_upload(upload_token, upload):
+    """Save a file sent to a local upload target; returns the stored name"""
+    try:
+        target = signing.loads(upload_token, salt=TARGET_SIGNING_SALT)
+    except signing.BadSignature:
+        raise DirectUploadError('Invalid upload target')
+    if target['expires_at'] < time.time():
+        raise DirectUploadError('This upload target has expired; request a new one')
+    if upload.size > settings.DIRECT_UPLOAD_MAX_BYTES:
+        raise DirectUploadError(f'Files may be at most {settings.DIRECT_UPLOAD_MAX_BYTES} bytes')
+    if upload.content_type != target['content_type']:
+        raise DirectUploadError(f"This target only accepts {target['content_type']}")
+
+    storage = local_storage()
+    # Re-uploading to the same target replaces the file
+    storage.delete(target['name'])
+    return storage.save(target['name'], upload)
+
+
+def is_upload_reference(value):
+    """A reference, alone or with Cloudinary's upload response ({"reference": ..., ...})"""
+    if isinstance(value, dict):
+        value = value.get('reference')
+    return isinstance(value, str) and value.startswith(DIRECT_UPLOAD_PREFIX)
+
+
+def verified_cloudinary_value(payload, upload):
+    """
+    Versioned field value of a Cloudinary upload, once the upload response sent
+    with the reference proves the file was stored under the reference's public id
+    """
+    public_id = f"{CLOUDINARY_FOLDER}/{payload['name']}"
+    version = str(upload.get('version', ''))
+    signature = upload.get('signature')
+    if not version.isdigit() or not isinstance(signature, str):
+        raise DirectUploadError(
+            "Send Cloudinary's upload response with the reference: "
+            '{"reference": ..., "public_id": ..., "version": ..., "signature": ...}'
+        )
+    if upload.get('public_id') != public_id or not verify_api_response_signature(public_id, version, signature):
+        raise DirectUploadError('The upload response does not match this upload reference')
+    return f'image/upload/v{version}/{public_id}'
+
+
+def resolve_upload_reference(reference, user):
+    """
+    Stored field value for a reference issued to user; raises DirectUploadError.
+    reference is the reference string or, for the cloudinary backend, a dict of
+    the reference and Cloudinary's upload response (see the module docstring).
+    """
+    upload = reference if isinstance(reference, dict) else {}
+    reference = upload.get('reference', reference)
+    try:
+        payload = signing.loads(
+            reference[len(DIRECT_UPLOAD_PREFIX):], salt=SIGNING_SALT, max_age=REFERENCE_MAX_AGE
+        )
+    except signing.SignatureExpired:
+        raise DirectUploadError('This upload reference has expired; upload the file again')
+    except signing.BadSignature:
+        raise DirectUploadError('Invalid upload reference')
+    if payload['user'] != getattr(user, 'pk', None):
+        raise DirectUploadError('This upload reference was issued to another user')
+    if payload['backend'] == 'local' and not local_storage().exists(payload['name']):
+        raise DirectUploadError('Nothing was uploaded to this target')
+    if payload['backend'] == 'cloudinary':
+        return verified_cloudinary_value(payload, upload)
+    return payload['value']
@@ -0,0 +1,186 @@
+"""
+Bulk vehicle import from CSV or NDJSON
+
+Input is read line by line and handled IMPORT_BATCH_SIZE records at a time, so
+memory stays flat however large the file is. Per batch:
+  - every record is validated by one VehicleImportSerializer (VehicleSerializer
+    rules), and registration number uniqueness is checked with a single query
+  - valid rows are inserted with one bulk_create, together with their AssetJobs,
+    so logos are generated by the asset worker afterwards
+  - invalid rows are reported by line number and never abort the batch
+  - photos given as stored values take a reference on their media asset
+
+Used by POST /api/vehicles/import/ and `manage.py import_vehicles`.
+"""
+import csv
+import json
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from rest_framework.exceptions import ValidationError
+
+from .media_assets import MEDIA_FIELDS, acquire_values, media_value
+from .models import AssetJob, Vehicle
+from .serializers import VehicleSerializer
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+# Records validated and inserted per transaction
+IMPORT_BATCH_SIZE = 500
+
+# Per-row errors kept in the report; 'failed' still counts every rejected row
+IMPORT_MAX_REPORTED_ERRORS = 1000
+
+
+class VehicleImportSerializer(VehicleSerializer):
+    """VehicleSerializer without the per-row uniqueness query (checked per batch instead)"""
+
+    class Meta(VehicleSerializer.Meta):
+        extra_kwargs = {'registration_number': {'validators': []}}
+
+
+def guess_format(filename):
+    """'csv' or 'ndjson' from a file name, None when the extension is not known"""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'csv':
+        return 'csv'
+    if extension in ('ndjson', 'jsonl', 'json'):
+        return 'ndjson'
+    return None
+
+
+def decode_lines(lines):
+    """Decode an iterable of UTF-8 byte lines (e.g. an open file or an upload), dropping a BOM"""
+    first = True
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if first:
+            line = line.lstrip('\ufeff')
+            first = False
+        yield line
+
+
+def iter_records(lines, file_format):
+    """
+    Yield (line number, record, error) for every record of the input.
+    record is a dict of field values; error is a message when the line can't be parsed.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # Values beyond the header end up under the None key
+            record = {key.strip(): value for key, value in row.items() if key}
+            yield reader.line_num, record, None
+    elif file_format == 'ndjson':
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                yield line_number, None, f'Invalid JSON: {exc}'
+                continue
+            if not isinstance(record, dict):
+                yield line_number, None, 'Each line must be a JSON object'
+                continue
+            yield line_number, record, None
+    else:
+        raise ValueError(f"Unknown import format {file_format!r}; use one of {', '.join(IMPORT_FORMATS)}")
+
+
+def import_vehicles(lines, file_format, owner, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Import vehicles owned by owner from decoded lines of CSV or NDJSON.
+    Returns {'created': int, 'failed': int, 'errors': [{'line': int, 'errors': {...}}]}.
+    """
+    report = {'created': 0, 'failed': 0, 'errors': []}
+    batch = []
+    try:
+        for entry in iter_records(lines, file_format):
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                import_batch(batch, owner, report)
+                batch = []
+    except UnicodeDecodeError as exc:
+        # Earlier batches are already committed: import what was read, then stop
+        report_error(report, None, {'non_field_errors': [f'The file must be UTF-8 encoded ({exc}); import stopped']})
+    if batch:
+        import_batch(batch, owner, report)
+    report['errors'].sort(key=lambda error: error['line'] or 0)
+    return report
+
+
+def report_error(report, line_number, errors):
+    report['failed'] += 1
+    if len(report['errors']) < IMPORT_MAX_REPORTED_ERRORS:
+        report['errors'].append({'line': line_number, 'errors': errors})
+
+
+def import_batch(batch, owner, report):
+    """Validate, insert and queue asset jobs for one batch of (line, record, error) entries"""
+    # CurrentUserDefault only reads request.user
+    serializer = VehicleImportSerializer(context={'request': SimpleNamespace(user=owner)})
+    valid = []
+    for line_number, record, error in batch:
+        if error:
+            report_error(report, line_number, {'non_field_errors': [error]})
+            continue
+        try:
+            valid.append((line_number, serializer.run_validation(record)))
+        except ValidationError as exc:
+            report_error(report, line_number, exc.detail)
+
+    # One query for every registration number of the batch
+    registration_numbers = [attrs['registration_number'] for _, attrs in valid]
+    taken = set(
+        Vehicle.objects.filter(registration_number__in=registration_numbers)
+        .values_list('registration_number', flat=True)
+    )
+    vehicles = []
+    for line_number, attrs in valid:
+        registration_number = attrs['registration_number']
+        if registration_number in taken:
+            report_error(report, line_number, {
+                'registration_number': ['vehicle with this registration number already exists.']
+            })
+            continue
+        taken.add(registration_number)
+        vehicle = Vehicle(**attrs)
+        # bulk_create bypasses save(): fill in what it would have
+        vehicle.refresh_derived_fields()
+        vehicle.asset_status = Vehicle.ASSET_PENDING if vehicle.needs_assets() else Vehicle.ASSET_READY
+        vehicles.append((line_number, vehicle))
+
+    try:
+        with transaction.atomic():
+            insert_vehicles([vehicle for _, vehicle in vehicles])
+        report['created'] += len(vehicles)
+    except IntegrityError:
+        # A concurrent insert took one of the numbers: retry row by row to isolate it
+        for line_number, vehicle in vehicles:
+            try:
+                with transaction.atomic():
+                    vehicle.pk = None
+                    insert_vehicles([vehicle])
+                report['created'] += 1
+            except IntegrityError as exc:
+                report_error(report, line_number, {'non_field_errors': [str(exc)]})
+
+
+def insert_vehicles(vehicles):
+    """bulk_create the vehicles and their asset jobs (call inside a transaction)"""
+    Vehicle.objects.bulk_create(vehicles)
+    acquire_values(
+        media_value(getattr(vehicle, field)) for vehicle in vehicles for field in MEDIA_FIELDS['vehicles.Vehicle']
+    )
+    jobs = AssetJob.objects.bulk_create([
+        AssetJob(vehicle=vehicle, max_attempts=settings.ASSET_JOB_MAX_ATTEMPTS)
+        for vehicle in vehicles if vehicle.asset_status == Vehicle.ASSET_PENDING
+    ])
+    if settings.ASSET_JOBS_EAGER:
+        # Same as Vehicle.save(): no worker running, process the jobs after commit
+        from .asset_jobs import run_job_by_id
+        for job in jobs:
+            transaction.on_commit(lambda job_id=job.pk: run_job_by_id(job_id))
@@ -0,0 +1,93 @@
+"""
+Management command to compare VehicleSerializer with the .values() fast path
+Usage: python manage.py benchmark_serializers [--rows 10000] [--repeat 3]
+
+Inserts --rows vehicles with Cloudinary-style asset values inside a transaction
+that is rolled back afterwards. It then times both paths, query included, over
+the same rows and checks that they render byte-identical JSON.
+"""
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from vehicles.models import Vehicle
+from vehicles.read_serializers import VehicleRowSerializer, value_columns
+from vehicles.serializers import VehicleSerializer
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark rows"""
+
+
+class Command(BaseCommand):
+    help = 'Benchmark VehicleSerializer against VehicleRowSerializer (rows/sec)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Vehicles to serialize (default: 10000)')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path; the best is reported (default: 3)')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.seed(options['rows'])
+                self.compare(options['rows'], max(options['repeat'], 1))
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        today = date.today()
+        owner = User.objects.create_user('serializer-benchmark', password=None)
+        Vehicle.objects.bulk_create([
+            Vehicle(
+                owner=owner,
+                registration_number=f'BENCH{i:06d}',
+                registration_number_normalized=f'BENCH{i:06d}',
+                make='Make', model='Model', year=2020, color='White', fuel_type='petrol',
+                engine_number=f'E{i}', chassis_number=f'C{i}',
+                owner_name='Owner Name', owner_email='owner@example.com', owner_phone='9999999999',
+                owner_address='221B Example Street, Example City',
+                owner_photo=f'image/upload/v1712000000/vehicle_photos/owner_{i}.jpg',
+                front_photo=f'image/upload/v1712000000/vehicle_photos/front_{i}.jpg',
+                back_photo=f'image/upload/v1712000000/vehicle_photos/back_{i}.jpg',
+                side_photo='',
+                qr_code=f'https://res.cloudinary.com/demo/image/upload/v1712000000/vehicle_qr_codes/qr_BENCH{i:06d}.png',
+                logo=f'https://res.cloudinary.com/demo/image/upload/v1712000000/vehicle_logos/logo_BENCH{i:06d}.png',
+                insurance_expiry=today + timedelta(days=i % 400),
+                pollution_certificate_expiry=today + timedelta(days=i % 200),
+                next_expiry_date=today + timedelta(days=i % 200),
+                registration_date=today,
+            )
+            for i in range(count)
+        ], batch_size=1000)
+
+    def compare(self, count, repeat):
+        vehicles = Vehicle.objects.filter(owner__username='serializer-benchmark').order_by('id')
+
+        def model_path():
+            return VehicleSerializer(vehicles.select_related('owner'), many=True).data
+
+        def values_path():
+            return VehicleRowSerializer().many(vehicles.values(*value_columns()))
+
+        renderer = JSONRenderer()
+        if renderer.render(model_path()) != renderer.render(values_path()):
+            raise CommandError('VehicleRowSerializer output differs from VehicleSerializer')
+
+        results = {}
+        for name, path in (('VehicleSerializer', model_path), ('VehicleRowSerializer', values_path)):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                path()
+                timings.append(time.perf_counter() - started)
+            results[name] = count / min(timings)
+            self.stdout.write(f"{name:<22}{results[name]:>10.0f} rows/sec")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Identical JSON for {count} rows; speed-up x{results['VehicleRowSerializer'] / results['VehicleSerializer']:.1f}"
+        ))
@@ -0,0 +1,164 @@
+"""
+Management command to compare SQLite throughput with and without the tuned profile
+Usage: python manage.py benchmark_sqlite [--readers 4] [--writers 4] [--duration 5]
+
+Runs reader and writer processes (standing in for gunicorn workers) against a
+scratch database file, once with SQLite's defaults as Django opens them and once
+with settings.SQLITE_PRAGMAS and IMMEDIATE transactions. The workload mimics the
+hot paths: readers fetch an owner's newest vehicles, writers create a vehicle like
+Vehicle.save() does (read, insert vehicle + asset job, update) in one transaction.
+The real database is never touched.
+"""
+import math
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+OWNERS = 50
+
+SCHEMA = """
+CREATE TABLE vehicle (
+    id INTEGER PRIMARY KEY,
+    owner_id INTEGER NOT NULL,
+    registration_number TEXT NOT NULL UNIQUE,
+    owner_address TEXT NOT NULL,
+    qr_code TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX vehicle_owner_created ON vehicle (owner_id, created_at);
+CREATE TABLE assetjob (
+    id INTEGER PRIMARY KEY,
+    vehicle_id INTEGER NOT NULL,
+    status TEXT NOT NULL
+);
+"""
+
+
+def connect(path, tuned):
+    """Open a connection the way Django's SQLite backend would for the profile"""
+    # Django runs in autocommit and issues BEGIN itself; 5s is sqlite3's default timeout
+    conn = sqlite3.connect(path, timeout=5.0, isolation_level=None)
+    if tuned:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            conn.execute(f'PRAGMA {name}={value}')
+    return conn
+
+
+def run_worker(path, tuned, role, duration, seed):
+    """Run one reader or writer for `duration` seconds; returns (ops, locked errors, latencies)"""
+    conn = connect(path, tuned)
+    rng = random.Random(seed)
+    begin = 'BEGIN IMMEDIATE' if tuned else 'BEGIN'
+    ops = locked = 0
+    latencies = []
+    deadline = time.perf_counter() + duration
+    sequence = 0
+    while time.perf_counter() < deadline:
+        owner_id = rng.randrange(OWNERS)
+        started = time.perf_counter()
+        try:
+            if role == 'read':
+                conn.execute(
+                    'SELECT * FROM vehicle WHERE owner_id = ? ORDER BY created_at DESC LIMIT 50', (owner_id,)
+                ).fetchall()
+            else:
+                sequence += 1
+                now = time.time()
+                conn.execute(begin)
+                try:
+                    conn.execute('SELECT COUNT(*) FROM vehicle WHERE owner_id = ?', (owner_id,)).fetchone()
+                    cursor = conn.execute(
+                        'INSERT INTO vehicle (owner_id, registration_number, owner_address, created_at, updated_at) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        (owner_id, f'W{seed}-{sequence}', 'x' * 200, now, now),
+                    )
+                    conn.execute('INSERT INTO assetjob (vehicle_id, status) VALUES (?, ?)', (cursor.lastrowid, 'pending'))
+                    conn.execute('UPDATE vehicle SET qr_code = ?, updated_at = ? WHERE id = ?',
+                                 (f'qr/{cursor.lastrowid}.png', now, cursor.lastrowid))
+                    conn.execute('COMMIT')
+                except BaseException:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    raise
+        except sqlite3.OperationalError as e:
+            if 'locked' not in str(e) and 'busy' not in str(e):
+                raise
+            locked += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+        ops += 1
+    conn.close()
+    return ops, locked, latencies
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent SQLite reads/writes with the default and the tuned profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='Reader processes (default: 4)')
+        parser.add_argument('--writers', type=int, default=4, help='Writer processes (default: 4)')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per profile (default: 5)')
+        parser.add_argument('--rows', type=int, default=5000, help='Vehicles seeded before each run (default: 5000)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['readers']} reader(s), {options['writers']} writer(s), "
+            f"{options['duration']:.0f}s per profile, {options['rows']} seeded rows"
+        )
+        header = f"{'profile':<9}{'reads/s':>10}{'writes/s':>10}{'locked':>8}{'read p95':>11}{'write p95':>11}"
+        results = [self.run_profile(tuned, options) for tuned in (False, True)]
+        self.stdout.write(header)
+        for row in results:
+            self.stdout.write(row)
+
+    def run_profile(self, tuned, options):
+        """Seed a fresh scratch database and run the workers against it"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = str(Path(directory) / 'benchmark.sqlite3')
+            conn = connect(path, tuned)
+            conn.executescript(SCHEMA)
+            now = time.time()
+            conn.execute('BEGIN')
+            conn.executemany(
+                'INSERT INTO vehicle (owner_id, registration_number, owner_address, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                ((i % OWNERS, f'SEED{i}', 'x' * 200, now - i, now - i) for i in range(options['rows'])),
+            )
+            conn.execute('COMMIT')
+            conn.close()
+
+            roles = ['read'] * options['readers'] + ['write'] * options['writers']
+            with ProcessPoolExecutor(max_workers=len(roles)) as pool:
+                futures = [
+                    (role, pool.submit(run_worker, path, tuned, role, options['duration'], seed))
+                    for seed, role in enumerate(roles)
+                ]
+                outcome = {'read': [0, 0, []], 'write': [0, 0, []]}
+                for role, future in futures:
+                    ops, locked, latencies = future.result()
+                    outcome[role][0] += ops
+                    outcome[role][1] += locked
+                    outcome[role][2].extend(latencies)
+
+        duration = options['duration']
+        reads, writes = outcome['read'], outcome['write']
+        return (
+            f"{'tuned' if tuned else 'default':<9}"
+            f"{reads[0] / duration:>10.0f}{writes[0] / duration:>10.0f}{reads[1] + writes[1]:>8}"
+            f"{percentile(reads[2], 0.95) * 1000:>9.1f}ms{percentile(writes[2], 0.95) * 1000:>9.1f}ms"
+        )
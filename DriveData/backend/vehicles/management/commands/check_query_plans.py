@@ -0,0 +1,77 @@
+"""
+Management command to check that the list, search and dashboard queries use indexes
+Usage: python manage.py check_query_plans [--verbose]
+
+Runs the checks of vehicles/query_plans.py against the configured database:
+every SELECT of the checked endpoints is EXPLAINed and must not need a full
+table scan or a sort, and no endpoint may run more queries once there are more
+users and vehicles. The same checks run in the test suite (vehicles.tests);
+this command is for trying them on a real database, e.g. PostgreSQL.
+
+Everything runs in one transaction that is rolled back, so the sample data never
+persists.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from vehicles.query_plans import (
+    check_endpoint, create_sample_data, endpoint_cases, grow_sample_data, prefer_indexes,
+)
+
+
+class Rollback(Exception):
+    """Raised to discard the sample data once the plans are checked"""
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the queries of the list, search and dashboard endpoints and fail on table scans or sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose', action='store_true',
+                            help='Print every plan, not only the failing ones')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f"Query plan checks support SQLite and PostgreSQL, not {connection.vendor}")
+
+        failures = []
+        try:
+            with transaction.atomic():
+                prefer_indexes()
+                owner, staff, vehicle = create_sample_data()
+                cases = endpoint_cases(owner, staff, vehicle)
+                query_counts = {}
+                for case in cases:
+                    name = case[0]
+                    status_code, query_counts[name], plans = self.run_case(case)
+                    problems = [(name, sql, '; '.join(bad)) for sql, plan, bad in plans if bad]
+                    failures.extend(problems)
+                    if options['verbose']:
+                        for sql, plan, bad in plans:
+                            self.stdout.write(f"{name}\n  {sql}\n  {' | '.join(plan)}")
+                    if not problems:
+                        self.stdout.write(self.style.SUCCESS(f"✓ {name} ({query_counts[name]} queries)"))
+
+                grow_sample_data(owner)
+                for case in cases:
+                    name = case[0]
+                    status_code, count, plans = self.run_case(case, explain=False)
+                    if count > query_counts[name]:
+                        failures.append((
+                            name, f'{query_counts[name]} queries before, {count} with more rows', 'N+1 queries'
+                        ))
+                raise Rollback
+        except Rollback:
+            pass
+
+        if failures:
+            for name, sql, plan in failures:
+                self.stdout.write(self.style.ERROR(f"✗ {name}\n  {sql}\n  {plan}"))
+            raise CommandError(f"{len(failures)} query plan / query count problem(s)")
+        self.stdout.write(self.style.SUCCESS("All checked queries are served by indexes, with constant query counts"))
+
+    def run_case(self, case, explain=True):
+        status_code, count, plans = check_endpoint(*case, explain=explain)
+        if status_code >= 400:
+            raise CommandError(f"{case[0]}: {case[1].upper()} {case[2]} returned {status_code}")
+        return status_code, count, plans
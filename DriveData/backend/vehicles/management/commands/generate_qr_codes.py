@@ -1,36 +1,185 @@
 """
-Management command to generate QR codes for vehicles that don't have them
-Usage: python manage.py generate_qr_codes
+Management command to generate logos for vehicles that don't have them
+Usage: python manage.py generate_qr_codes [--workers 8] [--batch-size 200] [--force] [--since 2025-01-01]
+
+QR codes are no longer stored: GET /api/qr/<unique_id>.svg renders them on
+request. Vehicles that already have a logo need nothing, so without --force this
+backfill finds nothing to do on a registry whose asset jobs have all run.
+
+Vehicles are read in primary-key order, --batch-size at a time, and each batch
+is processed by a pool of threads (uploads are I/O bound) or processes. After
+every batch the highest finished primary key is written to a checkpoint file, so
+a killed run picks up where it stopped when started again with the same selectors.
 """
-from django.core.management.base import BaseCommand
+import json
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from vehicles.assets import warm_logo_template
 from vehicles.models import Vehicle
 
+STAGES = ['render_logo', 'upload_logo', 'save']
+
+
+def init_worker():
+    """Process pool initializer: set up Django and draw the logo template once per child"""
+    django.setup()
+    warm_logo_template()
+
+
+def process_vehicle(pk, force):
+    """
+    Generate and upload the assets of one vehicle.
+    Runs inside a pool worker; returns (pk, registration_number, timings, error).
+    """
+    timings = {}
+    registration_number = f"#{pk}"
+    try:
+        vehicle = Vehicle.objects.get(pk=pk)
+        registration_number = vehicle.registration_number
+        vehicle.generate_assets(force=force, timings=timings)
+        return pk, registration_number, timings, None
+    except Exception as e:
+        return pk, registration_number, timings, str(e)
+    finally:
+        # Pool threads are never reused by Django's request cycle, so release
+        # their connection here instead of leaking one per thread
+        connection.close()
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an unsorted list"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
 
 class Command(BaseCommand):
-    help = 'Generate QR codes and logos for vehicles that are missing them'
+    help = 'Generate logos for vehicles that are missing them (QR codes are rendered on request)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of vehicles processed in parallel (default: 1)')
+        parser.add_argument('--executor', choices=['thread', 'process'], default='thread',
+                            help='Pool type used when --workers > 1 (default: thread)')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Vehicles read and checkpointed per batch (default: 100)')
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate assets for every selected vehicle, not only missing ones')
+        parser.add_argument('--since', type=str, default=None,
+                            help='Only vehicles created on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--checkpoint', type=str,
+                            default=str(Path(settings.BASE_DIR) / '.generate_qr_codes.checkpoint'),
+                            help='File used to resume an interrupted run')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore any existing checkpoint and start from the beginning')
 
     def handle(self, *args, **options):
-        # Find vehicles without QR codes
-        vehicles_without_qr = Vehicle.objects.filter(qr_code='')
-        count = vehicles_without_qr.count()
-        
-        self.stdout.write(f"Found {count} vehicles without QR codes")
-        
-        for vehicle in vehicles_without_qr:
+        workers = max(options['workers'], 1)
+        batch_size = max(options['batch_size'], 1)
+        force = options['force']
+        checkpoint_path = Path(options['checkpoint'])
+
+        vehicles = Vehicle.objects.all()
+        if not force:
+            # Find vehicles without logos; QR codes need no stored asset
+            vehicles = vehicles.filter(logo='')
+        if options['since']:
             try:
-                self.stdout.write(f"Generating QR code for {vehicle.registration_number}...")
-                
-                # Generate QR code
-                vehicle.generate_qr_code()
-                
-                # Generate logo
-                vehicle.generate_logo()
-                
-                # Save the vehicle
-                vehicle.save(update_fields=['qr_code', 'logo'])
-                
-                self.stdout.write(self.style.SUCCESS(f"✓ Generated QR and logo for {vehicle.registration_number}"))
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"✗ Failed for {vehicle.registration_number}: {str(e)}"))
-        
-        self.stdout.write(self.style.SUCCESS(f"\nCompleted! Processed {count} vehicles"))
+                since = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+            vehicles = vehicles.filter(created_at__date__gte=since)
+
+        # The checkpoint only applies to a run with the same selectors
+        selector = {'force': force, 'since': options['since']}
+        last_pk = 0 if options['restart'] else self.read_checkpoint(checkpoint_path, selector)
+        if last_pk:
+            self.stdout.write(f"Resuming after vehicle #{last_pk} (checkpoint {checkpoint_path})")
+
+        count = vehicles.filter(pk__gt=last_pk).count()
+        self.stdout.write(f"Found {count} vehicles to process with {workers} {options['executor']} worker(s)")
+
+        if options['executor'] == 'process' and workers > 1:
+            # Forked children must not share the parent's open database connection
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+        else:
+            # Threads share this process's logo template cache
+            warm_logo_template()
+            pool = ThreadPoolExecutor(max_workers=workers)
+
+        stage_timings = {stage: [] for stage in STAGES}
+        processed = failed = 0
+        started = time.perf_counter()
+
+        # Keyset batches (pk > last finished pk) instead of one long-lived cursor:
+        # every read is a short indexed range query, so no read lock is held on
+        # SQLite while the workers write, and each batch boundary is a checkpoint
+        with pool:
+            while True:
+                batch = list(vehicles.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+                if not batch:
+                    break
+                processed, failed = self.run_batch(pool, batch, force, stage_timings, processed, failed)
+                last_pk = batch[-1]
+                self.write_checkpoint(checkpoint_path, selector, last_pk)
+
+        # The run completed: nothing left to resume
+        checkpoint_path.unlink(missing_ok=True)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"\nCompleted! Processed {processed} vehicles ({failed} failed) in {elapsed:.1f}s"
+        ))
+        self.print_summary(processed, elapsed, stage_timings)
+
+    def run_batch(self, pool, batch, force, stage_timings, processed, failed):
+        """Process one batch in the pool and wait for all of it before checkpointing"""
+        for pk, registration_number, timings, error in pool.map(process_vehicle, batch, [force] * len(batch)):
+            processed += 1
+            for stage, seconds in timings.items():
+                stage_timings.setdefault(stage, []).append(seconds)
+            if error:
+                failed += 1
+                self.stdout.write(self.style.ERROR(f"✗ Failed for {registration_number}: {error}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"✓ Generated logo for {registration_number}"))
+        return processed, failed
+
+    def print_summary(self, processed, elapsed, stage_timings):
+        """Throughput and per-stage latency percentiles"""
+        rate = processed / elapsed if elapsed else 0.0
+        self.stdout.write(f"Throughput: {rate:.2f} vehicles/sec")
+        for stage, values in stage_timings.items():
+            if values:
+                self.stdout.write(
+                    f"  {stage:<12} p50 {percentile(values, 0.50) * 1000:8.1f} ms   "
+                    f"p95 {percentile(values, 0.95) * 1000:8.1f} ms   (n={len(values)})"
+                )
+
+    def read_checkpoint(self, path, selector):
+        """Last finished primary key from a previous run with the same selectors, else 0"""
+        try:
+            checkpoint = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return 0
+        if checkpoint.get('selector') != selector:
+            self.stdout.write(self.style.WARNING(
+                f"Ignoring checkpoint {path}: it was written with different selectors"
+            ))
+            return 0
+        return int(checkpoint.get('last_pk', 0))
+
+    def write_checkpoint(self, path, selector, last_pk):
+        """Atomically record the highest primary key of a finished batch"""
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_text(json.dumps({'selector': selector, 'last_pk': last_pk}))
+        tmp_path.replace(path)
@@ -0,0 +1,53 @@
+"""
+Management command to bulk import vehicles from a CSV or NDJSON file
+Usage: python manage.py import_vehicles vehicles.csv --owner <username> [--format csv|ndjson] [--batch-size 500]
+
+Columns (CSV header) or keys (one JSON object per line) are VehicleSerializer
+fields. The file is streamed and imported in batches: invalid rows are reported
+by line number and skipped, valid rows are inserted with bulk_create and their
+logos are queued for `manage.py run_asset_worker`.
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from vehicles.importers import IMPORT_BATCH_SIZE, IMPORT_FORMATS, decode_lines, guess_format, import_vehicles
+
+
+class Command(BaseCommand):
+    help = 'Bulk import vehicles from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file to import')
+        parser.add_argument('--owner', required=True, help='Username that will own the imported vehicles')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, default=None,
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help=f'Rows validated and inserted per transaction (default: {IMPORT_BATCH_SIZE})')
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options['owner'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['owner']!r} does not exist")
+
+        file_format = options['format'] or guess_format(options['path'])
+        if file_format is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format csv or --format ndjson')
+
+        try:
+            # Binary mode: decode_lines() decodes UTF-8 line by line and drops a BOM
+            with open(options['path'], 'rb') as input_file:
+                report = import_vehicles(
+                    decode_lines(input_file), file_format, owner, batch_size=max(options['batch_size'], 1)
+                )
+        except OSError as exc:
+            raise CommandError(f"Cannot read {options['path']}: {exc}")
+
+        for error in report['errors']:
+            self.stdout.write(self.style.ERROR(f"✗ line {error['line']}: {error['errors']}"))
+        if report['failed'] > len(report['errors']):
+            self.stdout.write(self.style.WARNING(f"... {report['failed'] - len(report['errors'])} more error(s)"))
+        self.stdout.write(self.style.SUCCESS(
+            f"\nImported {report['created']} vehicle(s), {report['failed']} row(s) rejected. "
+            f"Logos are queued for the asset worker."
+        ))
@@ -0,0 +1,62 @@
+"""
+Management command to recompute the stored expiry status of every vehicle
+Usage: python manage.py refresh_expiry_status [--batch-size 1000]
+
+Vehicle.expiry_status depends on today's date, so it goes stale as days pass.
+Run this once a day (e.g. from cron shortly after midnight). Work is done with
+set-based UPDATEs per primary-key range, touching only rows whose status changed.
+Changed rows get a new updated_at, so cached scan payloads and dashboard
+validators notice the new status.
+"""
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from vehicles.models import EXPIRY_WARNING_DAYS, Vehicle
+
+
+class Command(BaseCommand):
+    help = 'Recompute next_expiry_date / expiry_status for all vehicles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Primary-key range updated per transaction (default: 1000)')
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        today = date.today()
+        warning_until = today + timedelta(days=EXPIRY_WARNING_DAYS)
+
+        bounds = Vehicle.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            self.stdout.write("No vehicles to refresh")
+            return
+
+        backfilled = changed = 0
+        for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+            batch = Vehicle.objects.filter(pk__gte=start, pk__lt=start + batch_size)
+            now = timezone.now()
+            with transaction.atomic():
+                # Rows written outside Vehicle.save() (e.g. raw SQL) may lack the date
+                backfilled += batch.filter(next_expiry_date__isnull=True).update(
+                    next_expiry_date=Least('insurance_expiry', 'pollution_certificate_expiry'), updated_at=now
+                )
+                # Same thresholds as expiry_status_for()
+                changed += batch.filter(next_expiry_date__lte=today).exclude(expiry_status='red').update(
+                    expiry_status='red', updated_at=now
+                )
+                changed += batch.filter(
+                    next_expiry_date__gt=today, next_expiry_date__lte=warning_until
+                ).exclude(expiry_status='yellow').update(expiry_status='yellow', updated_at=now)
+                changed += batch.filter(next_expiry_date__gt=warning_until).exclude(expiry_status='green').update(
+                    expiry_status='green', updated_at=now
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Expiry status refreshed for {today}: {changed} vehicle(s) changed status, "
+            f"{backfilled} next expiry date(s) backfilled"
+        ))
@@ -0,0 +1,77 @@
+"""
+Management command that processes queued logo generation jobs
+Usage: python manage.py run_asset_worker [--once] [--poll-interval 2]
+
+The queue lives in the database (vehicles.AssetJob), so the worker needs no
+broker: run it next to gunicorn on the same machine, or as many copies as you like.
+"""
+import signal
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from vehicles.asset_jobs import claim_next_job, requeue_stale_jobs, run_job
+from vehicles.assets import warm_logo_template
+
+
+class Command(BaseCommand):
+    help = 'Process pending logo generation jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the jobs that are currently due and exit')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='Seconds to sleep when the queue is empty (default: 2)')
+        parser.add_argument('--max-jobs', type=int, default=None,
+                            help='Exit after processing this many jobs')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='Requeue running jobs locked longer than this many seconds (default: 600)')
+        parser.add_argument('--no-prewarm', action='store_true',
+                            help='Draw the logo template lazily on the first job instead of at start')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+
+        if not options['no_prewarm']:
+            warm_logo_template()
+
+        stale_after = timedelta(seconds=options['stale_after'])
+        processed = succeeded = 0
+        self.stdout.write("Asset worker started")
+
+        while not self.stopping:
+            close_old_connections()
+            requeued = requeue_stale_jobs(stale_after)
+            if requeued:
+                self.stdout.write(self.style.WARNING(f"Requeued {requeued} stale job(s)"))
+
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            processed += 1
+            if run_job(job):
+                succeeded += 1
+                self.stdout.write(self.style.SUCCESS(f"✓ Assets ready for {job.vehicle.registration_number}"))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f"✗ Job {job.pk} for {job.vehicle.registration_number} failed ({job.status})"
+                ))
+
+            if options['max_jobs'] and processed >= options['max_jobs']:
+                break
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\nAsset worker stopped. Processed {processed} job(s), {succeeded} succeeded"
+        ))
+
+    def request_stop(self, signum, frame):
+        """Finish the current job, then exit"""
+        self.stopping = True
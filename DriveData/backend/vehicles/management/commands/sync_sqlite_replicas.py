@@ -0,0 +1,57 @@
+"""
+Management command to copy the primary SQLite database onto the read replicas
+Usage: python manage.py sync_sqlite_replicas [--interval 5]
+
+Uses SQLite's online backup API, so the primary stays readable and writable while
+it runs. Each replica is written to a temporary file first and then renamed into
+place, so readers never see a half-copied database. This makes a second SQLite
+file usable as a replica for local testing or a single-machine setup. With
+--interval it keeps syncing until interrupted.
+"""
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database to every configured read replica'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Repeat every N seconds instead of syncing once')
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+        aliases = settings.DATABASE_REPLICA_ALIASES
+        if not aliases:
+            raise CommandError('No replicas configured (set DATABASE_REPLICAS)')
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('sync_sqlite_replicas only copies SQLite databases')
+
+        while True:
+            started = time.perf_counter()
+            for alias in aliases:
+                self.copy(str(primary['NAME']), str(settings.DATABASES[alias]['NAME']))
+            self.stdout.write(self.style.SUCCESS(
+                f"Synced {len(aliases)} replica(s) in {(time.perf_counter() - started) * 1000:.0f} ms"
+            ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def copy(self, source_path, target_path):
+        tmp_path = f'{target_path}.sync'
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(tmp_path)
+        try:
+            source.backup(target)
+            # A single self-contained file is safe to rename into place
+            target.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            target.close()
+            source.close()
+        os.replace(tmp_path, target_path)
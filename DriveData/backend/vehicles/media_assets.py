@@ -0,0 +1,204 @@
+"""
+Content-addressed storage for uploaded and generated media
+
+Before a photo, QR code or logo is uploaded, its SHA-256 is computed (in
+chunks). When a MediaAsset with that hash exists, its stored value is reused
+and nothing is uploaded. Otherwise the upload is registered as a new
+MediaAsset.
+
+Every field holding an asset's value counts as one reference:
+  - acquire_* functions are called when a value is assigned
+  - release_values() is called when it is replaced or its row is deleted
+When ref_count drops to zero the row is removed, and after commit the file is
+deleted from storage, unless another asset still uses the same public id.
+Photo renditions (vehicles.renditions) are stored on the asset of their original
+and deleted with it; their public ids derive from its hash, so they are kept
+when an asset with the same hash has been registered again in the meantime.
+Values without a MediaAsset row (stored before this existed, or direct
+uploads the server never saw) are never counted and never deleted.
+"""
+import hashlib
+import logging
+from collections import Counter
+from io import BytesIO
+
+import cloudinary.uploader
+from cloudinary import CloudinaryResource
+from cloudinary.models import CloudinaryField
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import MediaAsset
+
+logger = logging.getLogger(__name__)
+
+# Bytes hashed per read
+HASH_CHUNK_SIZE = 64 * 1024
+
+# Parses stored strings the way every CloudinaryField of this app does
+VALUE_PARSER = CloudinaryField()
+
+# Fields whose values are counted, by model label
+MEDIA_FIELDS = {
+    'vehicles.Vehicle': ('owner_photo', 'front_photo', 'back_photo', 'side_photo', 'qr_code', 'logo'),
+    'vehicles.Owner': ('photo',),
+    'vehicles.UserProfile': ('photo',),
+}
+
+
+def media_value(value):
+    """
+    Canonical stored string of a field value (CloudinaryResource, URL or public id),
+    None when empty. A URL assigned as a string is saved back as
+    'image/upload/<url>' once the row is re-saved, so both spellings map to the latter.
+    """
+    if not value:
+        return None
+    if not isinstance(value, CloudinaryResource):
+        value = VALUE_PARSER.parse_cloudinary_resource(str(value))
+    return value.get_prep_value()
+
+
+def read_and_hash(upload):
+    """(bytes, SHA-256 hex digest) of an uploaded file, read in chunks; the file is rewound"""
+    digest = hashlib.sha256()
+    chunks = []
+    upload.seek(0)
+    for chunk in upload.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+        chunks.append(chunk)
+    upload.seek(0)
+    return b''.join(chunks), digest.hexdigest()
+
+
+def acquire_existing(sha256):
+    """Take a reference on the asset with this content; returns its value, or None if there is none"""
+    row = MediaAsset.objects.filter(sha256=sha256).values_list('pk', 'value').first()
+    if row is None:
+        return None
+    # Conditional on the row still existing: a concurrent release may have removed it
+    if not MediaAsset.objects.filter(pk=row[0]).update(ref_count=F('ref_count') + 1, updated_at=timezone.now()):
+        return None
+    return row[1]
+
+
+def register_upload(sha256, value, public_id, size, resource_type='image', upload_type='upload'):
+    """
+    Record a fresh upload with one reference.
+    Returns (value to store, True) or, when a concurrent request registered the same
+    content first, (its value, False) - the caller then drops its own upload.
+    """
+    value = media_value(value)
+    try:
+        with transaction.atomic():
+            MediaAsset.objects.create(
+                sha256=sha256, value=value, public_id=public_id, size=size,
+                resource_type=resource_type, upload_type=upload_type, ref_count=1,
+            )
+        return value, True
+    except IntegrityError:
+        existing = acquire_existing(sha256)
+        if existing is None:
+            # Registered and released again in between: keep ours, untracked
+            return value, True
+        return existing, False
+
+
+def stored_renditions(hashes):
+    """sha256 -> photo renditions kept with that content, for the hashes that have them"""
+    if not hashes:
+        return {}
+    rows = MediaAsset.objects.filter(sha256__in=hashes).exclude(rendition_ids=[]).values_list('sha256', 'renditions')
+    return dict(rows)
+
+
+def attach_renditions(sha256, renditions, public_ids):
+    """Keep renditions with the asset of their original; False when there is no such asset"""
+    return bool(MediaAsset.objects.filter(sha256=sha256).update(
+        renditions=renditions, rendition_ids=public_ids, updated_at=timezone.now()
+    ))
+
+
+def acquire_values(values):
+    """Take one reference per occurrence of a stored value (values without an asset are ignored)"""
+    counts = Counter(value for value in values if value)
+    if not counts:
+        return
+    tracked = set(MediaAsset.objects.filter(value__in=counts).values_list('value', flat=True))
+    for value in tracked:
+        MediaAsset.objects.filter(value=value).update(
+            ref_count=F('ref_count') + counts[value], updated_at=timezone.now()
+        )
+
+
+def release_values(values):
+    """Drop one reference per occurrence; unreferenced assets are deleted (files after commit)"""
+    counts = Counter(value for value in values if value)
+    if not counts:
+        return
+    tracked = set(MediaAsset.objects.filter(value__in=counts).values_list('value', flat=True))
+    if not tracked:
+        return
+    for value in tracked:
+        MediaAsset.objects.filter(value=value, ref_count__gte=counts[value]).update(
+            ref_count=F('ref_count') - counts[value], updated_at=timezone.now()
+        )
+    orphans = MediaAsset.objects.filter(value__in=tracked, ref_count=0)
+    files = []
+    for public_id, resource_type, upload_type, sha256, rendition_ids in orphans.values_list(
+        'public_id', 'resource_type', 'upload_type', 'sha256', 'rendition_ids'
+    ):
+        files.append((public_id, resource_type, upload_type, None))
+        files.extend((rendition_id, 'image', 'upload', sha256) for rendition_id in rendition_ids)
+    orphans.delete()
+    if files:
+        transaction.on_commit(lambda: destroy_unused(files))
+
+
+def destroy_unused(files):
+    """
+    Delete files from storage unless an asset was registered for them since:
+    (public_id, resource_type, upload_type, sha256) tuples, where sha256 is the
+    hash of the original for renditions and None for originals
+    """
+    for public_id, resource_type, upload_type, sha256 in files:
+        if sha256 is not None:
+            in_use = MediaAsset.objects.filter(sha256=sha256).exists()
+        else:
+            in_use = MediaAsset.objects.filter(public_id=public_id).exists()
+        if in_use:
+            continue
+        try:
+            cloudinary.uploader.destroy(public_id, resource_type=resource_type, type=upload_type)
+            logger.info("Deleted unreferenced media %s", public_id)
+        except Exception:
+            logger.warning("Could not delete unreferenced media %s", public_id, exc_info=True)
+
+
+def store_generated(data, **upload_options):
+    """
+    Upload generated image bytes (QR code, logo) unless the same content is stored
+    already; returns the secure URL to store, holding one reference on it.
+    """
+    sha256 = hashlib.sha256(data).hexdigest()
+    existing = acquire_existing(sha256)
+    if existing is not None:
+        return existing
+    upload_result = cloudinary.uploader.upload(BytesIO(data), **upload_options)
+    # Generated assets use fixed public ids, so a lost race overwrote the same file: keep it
+    value, fresh = register_upload(
+        sha256, upload_result['secure_url'], upload_result['public_id'], len(data),
+        upload_result.get('resource_type', 'image'), upload_result.get('type', 'upload'),
+    )
+    return value
+
+
+@receiver(post_delete, sender='vehicles.Vehicle')
+@receiver(post_delete, sender='vehicles.Owner')
+@receiver(post_delete, sender='vehicles.UserProfile')
+def release_deleted_media(sender, instance, **kwargs):
+    """A deleted vehicle / owner / profile gives up its references"""
+    release_values(media_value(getattr(instance, field)) for field in MEDIA_FIELDS[sender._meta.label])
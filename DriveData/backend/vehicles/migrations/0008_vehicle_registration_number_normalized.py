@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 09:12
+
+import re
+
+from django.db import migrations, models
+
+
+def populate_normalized_registration_numbers(apps, schema_editor):
+    Vehicle = apps.get_model('vehicles', 'Vehicle')
+    vehicles = []
+    for vehicle in Vehicle.objects.only('id', 'registration_number').iterator(chunk_size=500):
+        vehicle.registration_number_normalized = re.sub(r'[\s-]+', '', vehicle.registration_number or '').upper()
+        vehicles.append(vehicle)
+    Vehicle.objects.bulk_update(vehicles, ['registration_number_normalized'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0007_alter_owner_photo_alter_userprofile_photo_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='registration_number_normalized',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=50),
+        ),
+        migrations.RunPython(populate_normalized_registration_numbers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-18 10:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def set_initial_asset_status(apps, schema_editor):
+    """Vehicles that already have both assets are ready; queue a job for the rest"""
+    Vehicle = apps.get_model('vehicles', 'Vehicle')
+    AssetJob = apps.get_model('vehicles', 'AssetJob')
+    complete = Vehicle.objects.exclude(qr_code='').exclude(logo='').exclude(qr_code__isnull=True).exclude(logo__isnull=True)
+    complete.update(asset_status='ready')
+    missing = Vehicle.objects.exclude(pk__in=complete.values('pk')).values_list('pk', flat=True)
+    AssetJob.objects.bulk_create(
+        [AssetJob(vehicle_id=pk) for pk in missing.iterator(chunk_size=500)],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0008_vehicle_registration_number_normalized'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='asset_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='AssetJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='asset_jobs', to='vehicles.vehicle')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='assetjob_status_run_after')],
+            },
+        ),
+        migrations.RunPython(set_initial_asset_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0 on 2026-10-18 11:40
+
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Least
+
+
+def populate_expiry_fields(apps, schema_editor):
+    Vehicle = apps.get_model('vehicles', 'Vehicle')
+    today = date.today()
+    warning_until = today + timedelta(days=30)
+    Vehicle.objects.update(next_expiry_date=Least('insurance_expiry', 'pollution_certificate_expiry'))
+    Vehicle.objects.filter(next_expiry_date__lte=today).update(expiry_status='red')
+    Vehicle.objects.filter(next_expiry_date__gt=today, next_expiry_date__lte=warning_until).update(expiry_status='yellow')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0009_vehicle_asset_status_assetjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='expiry_status',
+            field=models.CharField(choices=[('green', 'Valid'), ('yellow', 'Expiring soon'), ('red', 'Expired')], db_index=True, default='green', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='vehicle',
+            name='next_expiry_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['owner', 'next_expiry_date'], name='vehicle_owner_next_expiry'),
+        ),
+        migrations.RunPython(populate_expiry_fields, migrations.RunPython.noop),
+    ]
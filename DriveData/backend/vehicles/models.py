@@ -1,21 +1,50 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from cloudinary.models import CloudinaryField
-import cloudinary.uploader
 import uuid
-import qrcode
 from io import BytesIO
 from django.core.files import File
-from PIL import Image, ImageDraw, ImageFont
+from .assets import LOGO_QR_SIZE, render_logo_image, render_qr_image, timed_stage
 import os
+import re
+from datetime import date
+
+
+# Documents expiring within this many days are flagged yellow on the dashboard
+EXPIRY_WARNING_DAYS = 30
+
+
+def normalize_registration_number(value):
+    """Canonical search form of a registration number: uppercase, no spaces or dashes"""
+    return re.sub(r'[\s-]+', '', value or '').upper()
+
+
+def expiry_status_for(expiry_date, today=None):
+    """
+    Dashboard status of an expiry date:
+    'green' (more than 30 days left), 'yellow' (1 to 30 days) or 'red' (expired or missing)
+    """
+    if not expiry_date:
+        return 'red'
+    days_remaining = (expiry_date - (today or date.today())).days
+    if days_remaining > EXPIRY_WARNING_DAYS:
+        return 'green'
+    elif days_remaining >= 1:
+        return 'yellow'
+    else:
+        return 'red'
 
 
 class UserProfile(models.Model):
     """Extended user profile to store additional information like photo"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     photo = CloudinaryField(null=True, blank=True)
+    # WebP renditions and blur placeholder of the photo (see vehicles.renditions)
+    photo_renditions = models.JSONField(default=dict, blank=True, editable=False)
     phone = models.CharField(max_length=15, blank=True)
     bio = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -70,12 +99,29 @@ class Vehicle(models.Model):
         ('hybrid', 'Hybrid'),
         ('cng', 'CNG'),
     ]
+
+    EXPIRY_STATUS_CHOICES = [
+        ('green', 'Valid'),
+        ('yellow', 'Expiring soon'),
+        ('red', 'Expired'),
+    ]
+
+    ASSET_PENDING = 'pending'
+    ASSET_READY = 'ready'
+    ASSET_FAILED = 'failed'
+    ASSET_STATUS_CHOICES = [
+        (ASSET_PENDING, 'Pending'),
+        (ASSET_READY, 'Ready'),
+        (ASSET_FAILED, 'Failed'),
+    ]
     
     # Unique identifier
     unique_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     
     # Vehicle Information
     registration_number = models.CharField(max_length=50, unique=True)
+    # Normalized copy used by the registry search (see normalize_registration_number)
+    registration_number_normalized = models.CharField(max_length=50, db_index=True, editable=False, default='')
     make = models.CharField(max_length=100)  # e.g., Toyota, Honda
     model = models.CharField(max_length=100)  # e.g., Camry, Civic
     year = models.IntegerField()
@@ -98,15 +144,23 @@ class Vehicle(models.Model):
     insurance_expiry = models.DateField()
     pollution_certificate_expiry = models.DateField()
     registration_date = models.DateField()
+    # Earlier of the two expiry dates and its status, kept in sync by save() and
+    # re-bucketed daily by `manage.py refresh_expiry_status`
+    next_expiry_date = models.DateField(null=True, blank=True, editable=False)
+    expiry_status = models.CharField(max_length=10, choices=EXPIRY_STATUS_CHOICES, default='green', db_index=True, editable=False)
     
     # Photos
     front_photo = CloudinaryField(null=True, blank=True)
     back_photo = CloudinaryField(null=True, blank=True)
     side_photo = CloudinaryField(null=True, blank=True)
+    # WebP renditions and blur placeholder per photo field (see vehicles.renditions)
+    photo_renditions = models.JSONField(default=dict, blank=True, editable=False)
     
     # QR Code & Logo
     qr_code = CloudinaryField(blank=True)
     logo = CloudinaryField(blank=True)
+    # Progress of the background QR/logo generation (see AssetJob)
+    asset_status = models.CharField(max_length=10, choices=ASSET_STATUS_CHOICES, default=ASSET_PENDING)
     
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
@@ -115,172 +169,188 @@ class Vehicle(models.Model):
     def __str__(self):
         return f"{self.registration_number} - {self.make} {self.model}"
 
+    # Stored fields computed from other fields, by source field
+    DERIVED_FIELDS = {
+        'registration_number': {'registration_number_normalized'},
+        'insurance_expiry': {'next_expiry_date', 'expiry_status'},
+        'pollution_certificate_expiry': {'next_expiry_date', 'expiry_status'},
+    }
+
+    def refresh_derived_fields(self, today=None):
+        """Recompute the normalized search key and the denormalized expiry columns"""
+        self.registration_number_normalized = normalize_registration_number(self.registration_number)
+        self.refresh_expiry_fields(today)
+
+    def refresh_expiry_fields(self, today=None):
+        """Recompute next_expiry_date / expiry_status from the two expiry dates"""
+        expiry_dates = [d for d in (self.insurance_expiry, self.pollution_certificate_expiry) if d]
+        self.next_expiry_date = min(expiry_dates) if expiry_dates else None
+        self.expiry_status = expiry_status_for(self.next_expiry_date, today)
+
     def save(self, *args, **kwargs):
-        # Save first to get primary key
+        # Keep the derived columns in sync, also for partial saves of their sources
+        self.refresh_derived_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            for source, derived in self.DERIVED_FIELDS.items():
+                if source in update_fields:
+                    update_fields |= derived
+            kwargs['update_fields'] = update_fields
+
         is_new = self.pk is None
-        super().save(*args, **kwargs)
-        
-        # Generate QR code and logo after object has pk (only for new objects)
-        if is_new:
-            try:
-                # Check if qr_code field is truly empty (not just empty string)
-                qr_code_value = str(self.qr_code) if self.qr_code else ""
-                logo_value = str(self.logo) if self.logo else ""
-                
-                # Generate QR code first (only if completely empty)
-                if not qr_code_value or qr_code_value == "":
-                    self.generate_qr_code()
-                    print(f"✅ QR code generated for {self.registration_number}")
-                
-                # Generate logo with embedded QR code (only if completely empty)
-                if not logo_value or logo_value == "":
-                    self.generate_logo()
-                    print(f"✅ Logo generated for {self.registration_number}")
-                
-                # Save both QR code and logo, prevent recursion
-                super().save(update_fields=['qr_code', 'logo'])
-            except Exception as e:
-                print(f"❌ Error generating QR/Logo for {self.registration_number}: {e}")
-                import traceback
-                traceback.print_exc()
-
-    def generate_qr_code(self):
-        """Generate QR code containing vehicle unique ID"""
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=10,
-            border=4,
-        )
-        
-        # QR code contains the unique ID
-        qr_data = str(self.unique_id)
-        qr.add_data(qr_data)
-        qr.make(fit=True)
+        if not is_new:
+            super().save(*args, **kwargs)
+            return
 
-        # Create QR code image with blue color to match theme
-        qr_image = qr.make_image(fill_color="#1e40af", back_color="white")
-        
-        # Save to BytesIO
-        buffer = BytesIO()
-        qr_image.save(buffer, format='PNG')
-        buffer.seek(0)
-        
-        # Upload to Cloudinary and get URL
-        filename = f'qr_{self.registration_number}'
-        upload_result = cloudinary.uploader.upload(
-            buffer,
-            resource_type="image",
-            public_id=filename,
-            folder="vehicle_qr_codes"
-        )
-        
-        # Assign Cloudinary URL to field
-        self.qr_code = upload_result["secure_url"]
-        
-        print(f"QR code generated and uploaded to Cloudinary for {self.registration_number}")
+        # New vehicles only get a queued job here; the logo is generated by the
+        # asset worker once the insert has committed, so creating a vehicle costs
+        # one INSERT instead of an upload.
+        needs_assets = self.needs_assets()
+        if not needs_assets:
+            self.asset_status = self.ASSET_READY
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if needs_assets:
+                job = AssetJob.objects.create(vehicle=self, max_attempts=settings.ASSET_JOB_MAX_ATTEMPTS)
+
+        if needs_assets and settings.ASSET_JOBS_EAGER:
+            # No worker running (local development): process the job in-process
+            # right after the surrounding transaction commits
+            from .asset_jobs import run_job_by_id
+            transaction.on_commit(lambda: run_job_by_id(job.pk))
 
-    def generate_logo(self):
+    def needs_assets(self):
+        """
+        True when the logo has not been generated yet. QR codes are rendered on
+        request (vehicles.qr_codes), so they are never stored for new vehicles.
+        """
+        logo_value = str(self.logo) if self.logo else ""
+        return not logo_value
+
+    def generate_assets(self, force=False, timings=None):
+        """
+        Generate the logo if it is missing (always when force=True), upload it and
+        mark the vehicle's assets as ready.
+        Called by the asset worker and the generate_qr_codes command; pass a dict
+        as timings to collect seconds spent per stage.
+        """
+        from .media_assets import media_value, release_values
+        replaced = []
+        if force or not (str(self.logo) if self.logo else ""):
+            replaced.append(media_value(self.logo))
+            self.generate_logo(timings)
+            print(f"✅ Logo generated for {self.registration_number}")
+
+        self.asset_status = self.ASSET_READY
+        with timed_stage(timings, 'save'):
+            super().save(update_fields=['logo', 'asset_status', 'updated_at'])
+        # A regenerated logo gives up the reference held by the previous one
+        release_values(replaced)
+
+    def generate_logo(self, timings=None):
         """Generate a unique logo with car silhouette and embedded QR code"""
-        # Create logo image (1200x600) - wider for better car shape
-        logo_width, logo_height = 1200, 600
-        
-        # Create base image with white background
-        logo_img = Image.new('RGB', (logo_width, logo_height), (255, 255, 255))
-        draw = ImageDraw.Draw(logo_img)
-        
-        # Define car silhouette coordinates (SUV shape)
-        car_color = (30, 30, 30)  # Very dark gray/black
-        blue_accent = (30, 64, 175)  # Blue color matching theme (#1e40af)
-        
-        # Main car body - simplified SUV silhouette
-        car_body = [
-            # Front hood
-            (200, 200), (350, 150), (450, 130), 
-            # Windshield and roof
-            (550, 130), (700, 130), (800, 150), (950, 200),
-            # Roof line
-            (950, 200), (950, 280), (920, 310),
-            # Back door/window
-            (920, 310), (920, 380), (880, 410),
-            # Bottom back
-            (880, 480), (820, 500), (780, 500), (750, 480),
-            # Between wheels
-            (750, 480), (450, 480), (420, 500), (380, 500), (340, 480),
-            # Bottom front
-            (340, 480), (280, 410), (280, 380), (240, 310),
-            # Front
-            (200, 280), (200, 200)
-        ]
-        draw.polygon(car_body, fill=car_color)
+        with timed_stage(timings, 'render_logo'):
+            # Static car artwork comes from the per-process template cache; only
+            # the QR code is drawn per vehicle
+            qr_image = render_qr_image(str(self.unique_id), LOGO_QR_SIZE)
+            logo_img = render_logo_image(qr_image)
         
-        # Windows (white areas)
-        # Front windshield
-        front_window = [(360, 170), (520, 150), (500, 240), (340, 260)]
-        draw.polygon(front_window, fill=(255, 255, 255))
+            # Save logo to buffer
+            buffer = BytesIO()
+            logo_img.save(buffer, format='PNG')
+            buffer.seek(0)
         
-        # Rear window  
-        rear_window = [(730, 150), (890, 170), (870, 260), (710, 240)]
-        draw.polygon(rear_window, fill=(255, 255, 255))
-        
-        # Blue accent on the side (door area)
-        side_accent = [(950, 220), (1050, 280), (1050, 360), (950, 360)]
-        draw.polygon(side_accent, fill=blue_accent)
-        
-        # Front wheel
-        wheel_y = 440
-        draw.ellipse([280, wheel_y, 400, wheel_y + 120], fill=car_color)
-        draw.ellipse([310, wheel_y + 30, 370, wheel_y + 90], fill=(255, 255, 255))
-        draw.ellipse([325, wheel_y + 45, 355, wheel_y + 75], fill=car_color)
-        
-        # Rear wheel
-        draw.ellipse([780, wheel_y, 900, wheel_y + 120], fill=car_color)
-        draw.ellipse([810, wheel_y + 30, 870, wheel_y + 90], fill=(255, 255, 255))
-        draw.ellipse([825, wheel_y + 45, 855, wheel_y + 75], fill=car_color)
-        
-        # Load and embed QR code in the center of the car
-        if self.qr_code:
-            try:
-                # Download QR code from Cloudinary URL
-                from urllib.request import urlopen
-                qr_url = str(self.qr_code)
-                print(f"☁️ Downloading QR code from: {qr_url}")
-                response = urlopen(qr_url)
-                qr_img = Image.open(BytesIO(response.read()))
-                
-                # Resize QR code to fit prominently in car body
-                qr_size = 300
-                qr_img = qr_img.resize((qr_size, qr_size), Image.Resampling.LANCZOS)
-                
-                # Position QR code in the center/door area of the car
-                qr_x = (logo_width - qr_size) // 2
-                qr_y = (logo_height - qr_size) // 2 + 30
-                
-                # Paste QR code directly (it already has white background)
-                logo_img.paste(qr_img, (qr_x, qr_y))
-                print(f"✅ QR code embedded in logo for {self.registration_number}")
-            except Exception as e:
-                print(f"❌ Error embedding QR code in logo: {e}")
-                import traceback
-                traceback.print_exc()
-        
-        # Save logo to buffer
-        buffer = BytesIO()
-        logo_img.save(buffer, format='PNG')
-        buffer.seek(0)
-        
-        # Upload to Cloudinary and get URL
+        # Upload to Cloudinary (unless the same image is stored already) and get URL
+        from .media_assets import store_generated
         filename = f'logo_{self.registration_number}'
-        upload_result = cloudinary.uploader.upload(
-            buffer,
-            resource_type="image",
-            public_id=filename,
-            folder="vehicle_logos"
-        )
-        
-        # Assign Cloudinary URL to field
-        self.logo = upload_result["secure_url"]
+        with timed_stage(timings, 'upload_logo'):
+            self.logo = store_generated(
+                buffer.getvalue(),
+                resource_type="image",
+                public_id=filename,
+                folder="vehicle_logos"
+            )
         print(f"Logo generated and uploaded to Cloudinary for {self.registration_number}")
 
     class Meta:
         ordering = ['-created_at']
+        # Each list/dashboard query filters by owner (or nothing, for staff) and
+        # orders by one of these columns, so it is an index walk with no sort step.
+        # `manage.py check_query_plans` fails if one of them stops being used.
+        indexes = [
+            # "Expiring within N days" is a range scan on this index
+            models.Index(fields=['owner', 'next_expiry_date'], name='vehicle_owner_next_expiry'),
+            # My vehicles, newest first
+            models.Index(fields=['owner', 'created_at'], name='vehicle_owner_created'),
+            # Staff views over the whole registry
+            models.Index(fields=['created_at'], name='vehicle_created'),
+            models.Index(fields=['next_expiry_date'], name='vehicle_next_expiry'),
+            # MAX(updated_at) / COUNT(*) validators for conditional GETs
+            models.Index(fields=['owner', 'updated_at'], name='vehicle_owner_updated'),
+            models.Index(fields=['updated_at'], name='vehicle_updated'),
+        ]
+
+
+class AssetJob(models.Model):
+    """
+    Durable queue entry for a vehicle's logo generation.
+    Rows live in the main database, so the queue needs no external broker;
+    `python manage.py run_asset_worker` claims and processes them.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='asset_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"AssetJob #{self.pk} for vehicle {self.vehicle_id} ({self.status})"
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='assetjob_status_run_after'),
+        ]
+
+
+class MediaAsset(models.Model):
+    """
+    One stored file, shared by every photo / QR / logo field holding the same content.
+    Uploads are looked up by SHA-256 first, and ref_count counts the fields that
+    hold `value`; the file is deleted from storage when it drops to zero
+    (see vehicles/media_assets.py).
+    """
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    # Exactly what the fields store: a CloudinaryField value or a delivery URL
+    value = models.CharField(max_length=255, db_index=True)
+    public_id = models.CharField(max_length=255, db_index=True)
+    resource_type = models.CharField(max_length=20, default='image')
+    upload_type = models.CharField(max_length=20, default='upload')
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    # Photo renditions of this content (see vehicles.renditions) and their public ids
+    renditions = models.JSONField(default=dict, blank=True)
+    rendition_ids = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.public_id} ({self.ref_count} reference(s))"
@@ -0,0 +1,168 @@
+"""
+Cursor pagination for DriveData list endpoints
+
+Keyset pagination keeps deep pages as cheap as the first one: each page is a
+range scan that starts from the position encoded in the cursor instead of an
+OFFSET that has to walk every preceding row.
+
+DRF's CursorPagination only puts the first ordering column in the cursor and
+steps over rows that share its value with an offset, capped at 1000. On columns
+with many ties (expiry dates after a fleet renewal, per-user vehicle counts)
+that offset grows with every page until the cursor stops advancing. The cursor
+here holds every ordering column, so ties are resolved by the tie-breaker:
+
+    (next_expiry_date, id) > (d, i)  =>  next_expiry_date > d OR (next_expiry_date = d AND id > i)
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def invert_ordering(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def encode_value(value):
+    """JSON-safe form of a cursor column value (dates and datetimes are tagged)"""
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return parse_datetime(value['dt'])
+        if 'd' in value:
+            return parse_date(value['d'])
+        raise ValueError('Unknown cursor value')
+    return value
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    CursorPagination whose cursor holds the values of every ordering column.
+    The ordering must end in a unique column (id) and its columns must not be NULL.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.position, self.reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = tuple(invert_ordering(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self.after(ordering, self.position))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if self.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = self.position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        return self.page
+
+    @staticmethod
+    def after(ordering, position):
+        """Rows strictly after position in ordering (lexicographic over the columns)"""
+        first = ordering[0]
+        # Redundant bound on the leading column, so the database can range-scan its index
+        condition = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": position[0]})
+        after = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            after |= Q(**equal, **{f"{name}__{'lt' if field.startswith('-') else 'gt'}": value})
+            equal[name] = value
+        return condition & after
+
+    def row_position(self, row):
+        """Ordering column values of a result, a .values() dict or a model instance"""
+        names = [field.lstrip('-') for field in self.ordering]
+        if isinstance(row, dict):
+            return [row[name] for name in names]
+        return [getattr(row, name) for name in names]
+
+    def decode_cursor(self, request):
+        """(position or None, reverse) from the request's cursor"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            position = [decode_value(value) for value in cursor['p']]
+            reverse = bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if len(position) != len(self.ordering) or None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps(
+            {'p': [encode_value(value) for value in position], 'r': int(reverse)}, separators=(',', ':')
+        )
+        encoded = urlsafe_b64encode(payload.encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            return self.encode_cursor(self.row_position(self.page[-1]), False)
+        # An empty page reached backwards: continue from where we came from
+        return self.encode_cursor(self.position, False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            return self.encode_cursor(self.row_position(self.page[0]), True)
+        if self.position is None:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.position, True)
+
+
+class CreatedAtCursorPagination(KeysetCursorPagination):
+    """
+    Default paginator: newest first, id as tie-breaker.
+    The tie-breaker runs in the same direction as the main column, so the
+    ordering is a plain (backwards) walk of the created_at indexes.
+    Clients may ask for a smaller or larger page with ?page_size=,
+    capped at settings.API_MAX_PAGE_SIZE.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+
+class ExpiryCursorPagination(CreatedAtCursorPagination):
+    """
+    Paginator for the expiry views: earliest expiry of either document first.
+    next_expiry_date is never NULL: both expiry dates are required.
+    """
+    ordering = ('next_expiry_date', 'id')
+
+
+class DateJoinedCursorPagination(CreatedAtCursorPagination):
+    """Paginator for user listings: most recently joined first"""
+    ordering = ('-date_joined', '-id')
@@ -0,0 +1,238 @@
+"""
+Concurrent upload of the photo files of one create/update request
+
+CloudinaryField uploads files one by one in pre_save(), so a vehicle with four
+photos waited for the sum of four uploads. PhotoUploadBatch starts all of them
+at once on a bounded thread pool, before the model is saved, and hands the
+fields CloudinaryResources instead of files:
+
+    batch = None
+    try:
+        batch = PhotoUploadBatch(Vehicle, {'front_photo': upload, ...})
+        validated_data.update(batch.wait())
+        ...save...
+    except Exception:
+        if batch is not None:
+            batch.discard()
+        raise
+
+It is all or nothing: if one upload fails, the ones that succeeded are deleted
+again and PhotoUploadFailed (502) is raised, and discard() does the same when
+the save itself fails.
+
+Files are hashed first: content that is stored already (vehicles.media_assets)
+is reused instead of uploaded again. save_with_photos() wraps the whole
+create/update, including the reference counting of replaced values. Photo
+renditions rendered meanwhile (vehicles.renditions) are handed to the batch,
+which keeps them with the stored content, or deletes them in discard().
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import cloudinary.uploader
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .media_assets import (
+    acquire_existing, acquire_values, attach_renditions, media_value, read_and_hash, register_upload, release_values,
+)
+from .models import MediaAsset
+from .renditions import destroy_renditions
+
+logger = logging.getLogger(__name__)
+
+# Uploads running at once per request (one per photo field of a vehicle)
+PHOTO_UPLOAD_WORKERS = 4
+
+
+class PhotoUploadFailed(APIException):
+    status_code = status.HTTP_502_BAD_GATEWAY
+    default_detail = 'Photo upload failed; nothing was saved. Please try again.'
+    default_code = 'photo_upload_failed'
+
+
+def upload_photo(data, options):
+    """Upload one file (as bytes); returns (CloudinaryResource, seconds)"""
+    started = time.perf_counter()
+    resource = cloudinary.uploader.upload_resource(BytesIO(data), **options)
+    return resource, time.perf_counter() - started
+
+
+def delete_photo(field_name, resource):
+    """Best-effort removal of an uploaded photo that won't be used"""
+    try:
+        cloudinary.uploader.destroy(resource.public_id, type=resource.type, resource_type=resource.resource_type)
+    except Exception:
+        logger.warning("Could not delete orphaned %s upload %s", field_name, resource.public_id, exc_info=True)
+
+
+class PhotoUploadBatch:
+    """Uploads started together for one model save (see the module docstring)"""
+
+    def __init__(self, model, uploads, instance=None):
+        self.model = model
+        self.resources = {}
+        self.futures = {}
+        # Stored values this batch holds a reference on
+        self.acquired = []
+        # Fields whose file is identical to an earlier field of the same request
+        self.duplicates = {}
+        # Field name -> SHA-256 of every uploaded file
+        self.hashes = {}
+        # sha256 -> (renditions, public ids) rendered for this batch, and the
+        # hashes whose asset keeps them
+        self.renditions = {}
+        self.attached = set()
+        self.started = time.perf_counter()
+        self.pool = None
+        try:
+            self.start(uploads, instance)
+        except Exception:
+            # References taken for earlier fields must not leak
+            self.discard()
+            raise
+
+    def start(self, uploads, instance):
+        uploading = {}
+        for field_name, upload in uploads.items():
+            field = self.model._meta.get_field(field_name)
+            # Read here, so the upload threads never share the file object with the caller
+            data, sha256 = read_and_hash(upload)
+            self.hashes[field_name] = sha256
+            existing = acquire_existing(sha256)
+            if existing is not None:
+                self.acquired.append(existing)
+                self.resources[field_name] = field.to_python(existing)
+                logger.info("Reused stored %s (%d bytes)", field_name, len(data))
+                continue
+            if sha256 in uploading:
+                self.duplicates[field_name] = uploading[sha256]
+                continue
+            uploading[sha256] = field_name
+            # The options CloudinaryField.pre_save() would have used
+            options = {'type': field.type, 'resource_type': field.resource_type}
+            options.update({
+                key: value(instance) if callable(value) else value for key, value in field.options.items()
+            })
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=PHOTO_UPLOAD_WORKERS)
+            self.futures[field_name] = (len(data), sha256, self.pool.submit(upload_photo, data, options))
+
+    def acquire(self, values):
+        """Take references on values assigned as they are (public ids, URLs, direct uploads)"""
+        values = [media_value(value) for value in values]
+        acquire_values(values)
+        self.acquired.extend(value for value in values if value)
+
+    def add_renditions(self, renditions, public_ids):
+        """Renditions uploaded for this batch (sha256 -> renditions / public ids), kept by wait()"""
+        for sha256, ids in public_ids.items():
+            self.renditions[sha256] = (renditions[sha256], ids)
+
+    def keep_renditions(self):
+        """Store the renditions with the assets of their originals"""
+        for sha256, (renditions, public_ids) in self.renditions.items():
+            if attach_renditions(sha256, renditions, public_ids):
+                self.attached.add(sha256)
+
+    def wait(self):
+        """Field name -> CloudinaryResource once every upload is done; PhotoUploadFailed if any failed"""
+        if self.pool is None:
+            self.keep_renditions()
+            return dict(self.resources)
+        failed = []
+        upload_seconds = 0.0
+        for field_name, (size, sha256, future) in self.futures.items():
+            try:
+                resource, seconds = future.result()
+            except Exception:
+                logger.error("Upload of %s (%d bytes) failed", field_name, size, exc_info=True)
+                failed.append(field_name)
+                continue
+            upload_seconds += seconds
+            logger.info("Uploaded %s (%d bytes) in %.2fs", field_name, size, seconds)
+            value, fresh = register_upload(
+                sha256, resource.get_prep_value(), resource.public_id, size, resource.resource_type, resource.type
+            )
+            self.acquired.append(value)
+            if not fresh:
+                # Someone stored the same content meanwhile: use theirs
+                delete_photo(field_name, resource)
+                resource = self.model._meta.get_field(field_name).to_python(value)
+            self.resources[field_name] = resource
+        self.pool.shutdown()
+
+        for field_name, source in self.duplicates.items():
+            if source in self.resources:
+                self.acquire([self.resources[source]])
+                self.resources[field_name] = self.resources[source]
+
+        if failed:
+            self.discard()
+            raise PhotoUploadFailed(f"Upload of {', '.join(failed)} failed; nothing was saved. Please try again.")
+        self.keep_renditions()
+        logger.info(
+            "Uploaded %d photo(s) in %.2fs (%.2fs if sequential)",
+            len(self.resources), time.perf_counter() - self.started, upload_seconds,
+        )
+        return dict(self.resources)
+
+    def discard(self):
+        """
+        Give up the references this batch took and delete uploads that were never
+        registered, waiting for running uploads (the save failed). Renditions kept
+        with an asset go with it; the others are deleted unless their content is
+        stored by someone else (their public ids are shared then).
+        """
+        for field_name, (size, sha256, future) in self.futures.items():
+            if field_name in self.resources:
+                # Registered: released below, which deletes the file if nothing else uses it
+                continue
+            try:
+                resource, seconds = future.result()
+            except Exception:
+                continue
+            delete_photo(field_name, resource)
+        release_values(self.acquired)
+        orphaned = [sha256 for sha256 in self.renditions if sha256 not in self.attached]
+        if orphaned:
+            stored = set(MediaAsset.objects.filter(sha256__in=orphaned).values_list('sha256', flat=True))
+            destroy_renditions(
+                public_id for sha256 in orphaned if sha256 not in stored for public_id in self.renditions[sha256][1]
+            )
+        self.acquired = []
+        self.resources = {}
+        self.futures = {}
+        self.renditions = {}
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+def save_with_photos(model, fields, validated_data, instance, save, prepare=None):
+    """
+    Save a create/update whose validated_data may carry files for the given
+    CloudinaryFields: upload them concurrently (or reuse stored copies), call
+    prepare(validated_data, batch) meanwhile, then save(validated_data).
+    Values the save replaced give up their reference afterwards.
+    """
+    uploads = {field: validated_data[field] for field in fields if hasattr(validated_data.get(field), 'read')}
+    replaced = [
+        media_value(getattr(instance, field)) for field in fields
+        if instance is not None and field in validated_data
+    ]
+    batch = None
+    try:
+        batch = PhotoUploadBatch(model, uploads, instance)
+        batch.acquire(validated_data[field] for field in fields if field in validated_data and field not in uploads)
+        if prepare is not None:
+            prepare(validated_data, batch)
+        validated_data.update(batch.wait())
+        saved = save(validated_data)
+    except Exception:
+        if batch is not None:
+            batch.discard()
+        raise
+    release_values(replaced)
+    return saved
@@ -0,0 +1,88 @@
+"""
+QR codes rendered on request
+
+A vehicle's QR code only encodes its unique_id, so instead of being rendered,
+uploaded and stored once per vehicle it is drawn by GET /api/qr/<unique_id>.svg
+(or .png?size=N) whenever a client asks:
+  - the same unique_id, format and size always give the same bytes, so responses
+    carry an ETag and are cacheable for a year (immutable)
+  - recent renders are kept in a per-process LRU, so repeated misses of browser
+    and CDN caches cost a dictionary lookup
+Serializers expose this URL as the vehicle's qr_code.
+"""
+import uuid
+from functools import lru_cache
+
+from django.urls import reverse
+
+from .assets import render_qr_png, render_qr_svg
+from .conditional import make_etag
+
+QR_CONTENT_TYPES = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+}
+
+# Edge length of PNG renders in pixels (?size=); SVG scales freely
+QR_PNG_DEFAULT_SIZE = 512
+QR_PNG_MIN_SIZE = 64
+QR_PNG_MAX_SIZE = 2048
+
+# Renders kept per process (an SVG is ~2.5 KB, a 512px PNG ~1 KB)
+QR_CACHE_SIZE = 1024
+
+# Bump when the rendering changes, so cached copies get a new ETag
+QR_RENDER_VERSION = 1
+
+QR_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Reversed once; unique ids are substituted per vehicle
+_URL_PLACEHOLDER = uuid.UUID(int=0)
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def render_qr_code(data, image_format, size=None):
+    """QR code bytes of data as 'svg' or 'png' (size x size pixels)"""
+    if image_format == 'svg':
+        return render_qr_svg(data)
+    return render_qr_png(data, size)
+
+
+def qr_code_size(image_format, value):
+    """Pixel size of a render from the ?size= value; None for SVG. ValueError when invalid."""
+    if image_format == 'svg':
+        return None
+    if value is None:
+        return QR_PNG_DEFAULT_SIZE
+    try:
+        size = int(value)
+    except ValueError:
+        size = 0
+    if not QR_PNG_MIN_SIZE <= size <= QR_PNG_MAX_SIZE:
+        raise ValueError(f'size must be a whole number between {QR_PNG_MIN_SIZE} and {QR_PNG_MAX_SIZE}')
+    return size
+
+
+def qr_code_etag(unique_id, image_format, size=None):
+    return make_etag('qr', QR_RENDER_VERSION, unique_id, image_format, size)
+
+
+@lru_cache(maxsize=None)
+def qr_code_path_template(image_format):
+    path = reverse('vehicle-qr-code', kwargs={'unique_id': _URL_PLACEHOLDER, 'image_format': image_format})
+    return path.replace(str(_URL_PLACEHOLDER), '{}')
+
+
+class QrCodeUrlBuilder:
+    """Absolute QR code URLs for one request (relative paths without a request)"""
+
+    def __init__(self, request=None, image_format='svg'):
+        origin = request.build_absolute_uri('/')[:-1] if request is not None else ''
+        self.template = origin + qr_code_path_template(image_format)
+
+    def url(self, unique_id):
+        return self.template.format(unique_id)
+
+
+def qr_code_url(unique_id, request=None, image_format='svg'):
+    return QrCodeUrlBuilder(request, image_format).url(unique_id)
@@ -0,0 +1,154 @@
+"""
+Query plan and query count checks for the list, search and dashboard endpoints
+
+Each endpoint is called in-process with a small throwaway data set, every
+SELECT it runs is captured and EXPLAINed, and a plan containing a full table
+scan or a sort step is reported:
+  - SQLite: 'SCAN <table>' without an index, or 'USE TEMP B-TREE'
+  - PostgreSQL: a 'Seq Scan' or 'Sort' node (planned with enable_seqscan and
+    enable_sort off, so they only show up when no index can serve the query)
+
+Every endpoint is then called again after adding more users and vehicles; its
+number of queries must not grow (an N+1 pattern).
+
+The checks run in vehicles.tests and from `manage.py check_query_plans`. Both
+run inside a transaction that is rolled back, so the data set never persists.
+Whole-registry aggregates (the staff dashboard stats) read every row by design
+and are not checked.
+"""
+import json
+import re
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .models import Vehicle
+
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (TABLE )?\S+( AS \S+)?$')
+POSTGRES_BAD_NODES = {'Seq Scan', 'Sort', 'Incremental Sort'}
+
+
+def prefer_indexes():
+    """On PostgreSQL, plan the rest of the transaction as if scans and sorts were unaffordable"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+
+
+def create_sample_data():
+    """Two owners with a few vehicles each, plus a staff user; returns (owner, staff, vehicle)"""
+    today = date.today()
+    owner = User.objects.create_user('plan-check-owner', password=None)
+    other = User.objects.create_user('plan-check-other', password=None)
+    staff = User.objects.create_user('plan-check-staff', password=None, is_staff=True)
+    vehicles = []
+    for i in range(20):
+        vehicles.append(Vehicle.objects.create(
+            owner=owner if i % 2 else other,
+            registration_number=f'PLANCHK{i:04d}',
+            make='Make', model='Model', year=2020, color='White', fuel_type='petrol',
+            engine_number=f'E{i}', chassis_number=f'C{i}',
+            insurance_expiry=today + timedelta(days=i * 5 - 20),
+            pollution_certificate_expiry=today + timedelta(days=i * 7 - 10),
+            registration_date=today,
+        ))
+    return owner, staff, vehicles[1]
+
+
+def grow_sample_data(owner):
+    """More users with vehicles, for the query count comparison"""
+    today = date.today()
+    for i in range(10):
+        user = User.objects.create_user(f'plan-check-extra{i}', password=None)
+        for j, vehicle_owner in enumerate((user, owner)):
+            Vehicle.objects.create(
+                owner=vehicle_owner,
+                registration_number=f'PLANCHKX{i:02d}{j}',
+                make='Make', model='Model', year=2020, color='White', fuel_type='petrol',
+                engine_number=f'EX{i}{j}', chassis_number=f'CX{i}{j}',
+                insurance_expiry=today + timedelta(days=i),
+                pollution_certificate_expiry=today + timedelta(days=i + 3),
+                registration_date=today,
+            )
+
+
+def endpoint_cases(owner, staff, vehicle):
+    """
+    (name, method, path, user, body, check_plan) for every endpoint whose queries are checked.
+    check_plan is False where a full pass is inherent, e.g. grouping every user
+    (auth_user belongs to django.contrib.auth, so this app adds no index to it).
+    """
+    return [
+        ('dashboard stats', 'get', '/api/dashboard/stats/', owner, None),
+        ('dashboard expiries', 'get', '/api/dashboard/expiries/', owner, None),
+        ('dashboard expiries (staff)', 'get', '/api/dashboard/expiries/', staff, None),
+        ('dashboard my vehicles', 'get', '/api/dashboard/my-vehicles/', owner, None),
+        ('dashboard my vehicles (staff)', 'get', '/api/dashboard/my-vehicles/', staff, None),
+        ('dashboard alerts summary', 'get', '/api/dashboard/alerts-summary/', owner, None),
+        ('dashboard alerts summary (staff)', 'get', '/api/dashboard/alerts-summary/', staff, None),
+        ('vehicle registry list', 'get', '/api/vehicles/', owner, None),
+        ('vehicle registry list (sparse)', 'get', '/api/vehicles/?fields=registration_number,make', owner, None),
+        ('vehicle detail', 'get', f'/api/vehicles/{vehicle.pk}/', owner, None),
+        ('vehicle search (prefix)', 'get', '/api/vehicles/search/?q=planchk00', owner, None),
+        ('vehicle search (exact)', 'get', '/api/vehicles/search/?q=PLANCHK0001&match=exact', owner, None),
+        ('QR scan', 'post', '/api/vehicles/scan/', None, {'unique_id': str(vehicle.unique_id)}),
+        ('admin vehicle list', 'get', '/api/admin/vehicles/', staff, None),
+        ('admin user list', 'get', '/api/admin/users/', staff, None, False),
+        ('admin user list by vehicle count', 'get', '/api/admin/users/?ordering=-vehicle_count&min_vehicles=1',
+         staff, None, False),
+    ]
+
+
+def check_endpoint(name, method, path, user, data, check_plan=True, explain=True):
+    """
+    Call one endpoint and EXPLAIN every SELECT it ran.
+    Returns (status code, number of queries, [(sql, plan lines, problems)] of the
+    SELECTs); the plans are left out when check_plan or explain is False.
+    """
+    # localhost is always in ALLOWED_HOSTS, so absolute URLs can be built
+    factory = APIRequestFactory(SERVER_NAME='localhost')
+    request = getattr(factory, method)(path, data, format='json') if data else getattr(factory, method)(path)
+    if user is not None:
+        force_authenticate(request, user=user)
+    match = resolve(path.split('?')[0])
+
+    with CaptureQueriesContext(connection) as queries:
+        response = match.func(request, *match.args, **match.kwargs)
+
+    plans = []
+    if check_plan and explain:
+        for query in queries.captured_queries:
+            if query['sql'].lstrip().upper().startswith('SELECT'):
+                plans.append((query['sql'], *explain_query(query['sql'])))
+    return response.status_code, len(queries.captured_queries), plans
+
+
+def explain_query(sql):
+    """Return (plan lines, problems) for one captured statement"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = [row[-1] for row in cursor.fetchall()]
+            problems = [
+                line for line in plan
+                if SQLITE_FULL_SCAN.match(line) or 'USE TEMP B-TREE' in line
+            ]
+        else:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            raw = cursor.fetchone()[0]
+            root = (json.loads(raw) if isinstance(raw, str) else raw)[0]['Plan']
+            plan, problems = [], []
+            nodes = [root]
+            while nodes:
+                node = nodes.pop()
+                line = f"{node['Node Type']} {node.get('Relation Name', '')}".strip()
+                plan.append(line)
+                if node['Node Type'] in POSTGRES_BAD_NODES:
+                    problems.append(line)
+                nodes.extend(node.get('Plans', []))
+    return plan, problems
@@ -0,0 +1,169 @@
+"""
+Read-only fast path for Vehicle responses
+
+VehicleSerializer runs DRF's generic field machinery per row and builds every
+Cloudinary URL through CloudinaryResource.url. The list, search, scan and admin
+responses don't need any of that. They read plain .values() rows and turn them
+into exactly the same JSON: same keys, same order, same formatting.
+
+Cloudinary URLs come from a prefix built once per serializer,
+e.g. https://res.cloudinary.com/<cloud>/image/upload/. The stored version,
+public id and format are appended to it. Values the prefix can't reproduce
+(unversioned ids, characters that need escaping, signed or sharded delivery
+URLs) fall back to CloudinaryResource.url. qr_code is the on-request rendering
+URL (vehicles.qr_codes), built from unique_id.
+"""
+import re
+
+import cloudinary
+from cloudinary.utils import cloudinary_url
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from .qr_codes import QrCodeUrlBuilder
+from .serializers import VehicleSerializer
+
+CLOUDINARY_FIELDS = ('owner_photo', 'front_photo', 'back_photo', 'side_photo', 'logo')
+
+# Output keys in VehicleSerializer order: its readable fields, then 'owner',
+# which its to_representation() appends
+OUTPUT_FIELDS = [name for name in VehicleSerializer.Meta.fields if name != 'owner'] + ['owner']
+
+# .values() column for output keys that don't map to a column of the same name
+FIELD_SOURCES = {
+    'owner': 'owner_id',
+    'owner_username': 'owner__username',
+    'qr_code': 'unique_id',
+}
+
+# Public ids that cloudinary_url() would not escape or rewrite
+PLAIN_PUBLIC_ID = re.compile(r'^[A-Za-z0-9_\-][A-Za-z0-9_.\-/]*$')
+URL_SENTINEL = '__drivedata_public_id__'
+
+
+# Read even when not requested: cursor pagination positions on them
+ALWAYS_READ_COLUMNS = ('id', 'created_at')
+
+
+def requested_fields(request):
+    """
+    Sparse fieldset from ?fields=a,b or ?exclude=a,b, in serializer order.
+    Returns None when neither is given (every field). Unknown names are a 400.
+    """
+    fields_param = request.query_params.get('fields')
+    exclude_param = request.query_params.get('exclude')
+    if fields_param is None and exclude_param is None:
+        return None
+    if fields_param is not None and exclude_param is not None:
+        raise ValidationError({'error': 'Use either "fields" or "exclude", not both'})
+
+    names = {name.strip() for name in (fields_param if fields_param is not None else exclude_param).split(',') if name.strip()}
+    if not names:
+        raise ValidationError({'error': 'List at least one field name, comma separated'})
+    unknown = names - set(OUTPUT_FIELDS)
+    if unknown:
+        raise ValidationError({
+            'error': f"Unknown field(s): {', '.join(sorted(unknown))}. Available: {', '.join(OUTPUT_FIELDS)}"
+        })
+    if fields_param is not None:
+        return [name for name in OUTPUT_FIELDS if name in names]
+    return [name for name in OUTPUT_FIELDS if name not in names]
+
+
+def value_columns(fields=None):
+    """Columns to pass to .values() for the given output fields (default: all)"""
+    columns = []
+    for name in (OUTPUT_FIELDS if fields is None else fields):
+        column = FIELD_SOURCES.get(name, name)
+        if column not in columns:
+            columns.append(column)
+    return columns + [column for column in ALWAYS_READ_COLUMNS if column not in columns]
+
+
+def model_columns(fields):
+    """Columns to pass to .only() for the given output fields"""
+    columns = {'id', 'owner'}
+    for name in fields:
+        columns.add(FIELD_SOURCES.get(name, name).replace('owner_id', 'owner'))
+    return sorted(columns)
+
+
+class CloudinaryUrlBuilder:
+    """CloudinaryResource.url without the per-call option processing"""
+
+    def __init__(self):
+        config = cloudinary.config()
+        # Delivery options whose URL depends on the public id itself
+        self.templated = not (config.sign_url or config.cdn_subdomain or config.secure_cdn_subdomain)
+        self.prefixes = {}
+
+    def prefix(self, resource_type, upload_type):
+        key = (resource_type, upload_type)
+        if key not in self.prefixes:
+            try:
+                url = cloudinary_url(URL_SENTINEL, type=upload_type, resource_type=resource_type, version='1')[0]
+                self.prefixes[key] = url[:url.index('v1/' + URL_SENTINEL)]
+            except ValueError:
+                # No cloud_name configured: CloudinaryResource.url fails as well
+                self.prefixes[key] = None
+        return self.prefixes[key]
+
+    def url(self, resource):
+        """URL of a CloudinaryField value, None where VehicleSerializer gives None"""
+        if not resource:
+            return None
+        public_id = resource.public_id
+        upload_type = resource.type or 'upload'
+        # Stored full URLs (generated QR codes and logos) are returned as they are
+        if upload_type == 'upload' and public_id.startswith(('http:', 'https:')):
+            return public_id
+        if self.templated and resource.version and PLAIN_PUBLIC_ID.match(public_id) and '//' not in public_id:
+            prefix = self.prefix(resource.resource_type or 'image', upload_type)
+            if prefix is None:
+                return None
+            url = f'{prefix}v{resource.version}/{public_id}'
+            return f'{url}.{resource.format}' if resource.format else url
+        try:
+            return resource.url
+        except Exception:
+            return None
+
+
+class VehicleRowSerializer:
+    """
+    Serialize Vehicle .values() rows into the VehicleSerializer representation.
+    Build the rows with queryset.values(*value_columns(fields)). Pass the request
+    for absolute qr_code URLs, as VehicleSerializer builds them.
+    """
+
+    def __init__(self, fields=None, request=None):
+        self.fields = list(OUTPUT_FIELDS if fields is None else fields)
+        self.urls = CloudinaryUrlBuilder()
+        self.qr_urls = QrCodeUrlBuilder(request)
+        date_field = serializers.DateField()
+        datetime_field = serializers.DateTimeField()
+        converters = {
+            'unique_id': str,
+            'insurance_expiry': date_field.to_representation,
+            'pollution_certificate_expiry': date_field.to_representation,
+            'registration_date': date_field.to_representation,
+            'created_at': datetime_field.to_representation,
+            'updated_at': datetime_field.to_representation,
+        }
+        converters.update({name: self.urls.url for name in CLOUDINARY_FIELDS})
+        converters['qr_code'] = self.qr_urls.url
+        # (output key, row key, converter or None)
+        self.plan = [
+            (name, FIELD_SOURCES.get(name, name), converters.get(name))
+            for name in self.fields
+        ]
+
+    def to_representation(self, row):
+        data = {}
+        for name, source, convert in self.plan:
+            value = row[source]
+            data[name] = convert(value) if convert is not None and value is not None else value
+        return data
+
+    def many(self, rows):
+        return [self.to_representation(row) for row in rows]
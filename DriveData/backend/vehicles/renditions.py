@@ -0,0 +1,188 @@
+"""
+Upload-time renditions for vehicle and profile photos
+
+Originals are still stored as uploaded. Next to them, every uploaded photo gets
+WebP renditions at fixed sizes and a tiny blur placeholder, so list and detail
+pages can fetch only the size they show:
+
+    {'thumbnail': url, 'medium': url, 'full': url,
+     'placeholder': 'data:image/webp;base64,...', 'width': 1600, 'height': 1200}
+
+Decoding, resizing and encoding (Pillow releases the GIL for all three) and the
+rendition uploads run in a thread pool, so the photos of one request are
+processed side by side. Renditions are uploaded the same way as the generated
+logos.
+
+Renditions belong to the stored content of their original (vehicles.media_assets):
+their public ids are derived from its SHA-256, and the MediaAsset of the original
+keeps them. A photo whose content is stored already reuses its renditions
+instead of rendering them again, and they are deleted from storage together
+with the original.
+"""
+import base64
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import cloudinary.uploader
+from PIL import Image, ImageOps
+
+from .media_assets import stored_renditions
+
+logger = logging.getLogger(__name__)
+
+# Longest edge of each rendition in pixels; images are never upscaled
+RENDITION_SIZES = {
+    'full': 1600,
+    'medium': 640,
+    'thumbnail': 160,
+}
+WEBP_QUALITY = 80
+
+# Longest edge of the inline blur placeholder
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 40
+
+# Threads shared by the image work and the uploads of one request
+RENDITION_WORKERS = 4
+
+
+def encode_webp(image, quality):
+    buffer = BytesIO()
+    image.save(buffer, format='WEBP', quality=quality)
+    return buffer.getvalue()
+
+
+def render_renditions(data):
+    """
+    Render the WebP renditions of an image given as bytes.
+    Returns ({rendition name: WebP bytes}, placeholder data URI, (width, height) of 'full').
+    """
+    with Image.open(BytesIO(data)) as original:
+        largest = max(RENDITION_SIZES.values())
+        # JPEG only: decode straight at the smallest scale still >= the largest rendition
+        original.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    renditions = {}
+    size = None
+    # Largest first, each one resized from the previous (smaller) result
+    for name, edge in sorted(RENDITION_SIZES.items(), key=lambda item: -item[1]):
+        image.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        renditions[name] = encode_webp(image, WEBP_QUALITY)
+        size = size or image.size
+
+    image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BILINEAR)
+    placeholder = 'data:image/webp;base64,' + base64.b64encode(
+        encode_webp(image, PLACEHOLDER_QUALITY)
+    ).decode('ascii')
+    return renditions, placeholder, size
+
+
+def rendition_public_id(sha256, name):
+    """Public id of a rendition, derived from the content of its original"""
+    return f'{sha256[:32]}_{name}'
+
+
+def upload_rendition(data, public_id, folder):
+    """Upload one WebP rendition to Cloudinary; returns (URL, full public id)"""
+    upload_result = cloudinary.uploader.upload(
+        BytesIO(data),
+        resource_type="image",
+        public_id=public_id,
+        folder=folder,
+        format="webp"
+    )
+    return upload_result["secure_url"], upload_result["public_id"]
+
+
+def destroy_renditions(public_ids):
+    """Best-effort removal of rendition uploads that won't be used"""
+    for public_id in public_ids:
+        try:
+            cloudinary.uploader.destroy(public_id, resource_type='image', type='upload')
+        except Exception:
+            logger.warning("Could not delete orphaned rendition %s", public_id, exc_info=True)
+
+
+def build_renditions(originals, folder):
+    """
+    Renditions for several photos at once.
+    originals maps a SHA-256 to the photo's bytes. Returns (sha256 -> renditions dict,
+    sha256 -> public ids uploaded for it), leaving out photos that could not be
+    processed (clients then use the original).
+    """
+    if not originals:
+        return {}, {}
+    with ThreadPoolExecutor(max_workers=RENDITION_WORKERS) as pool:
+        rendered = {
+            sha256: pool.submit(render_renditions, data) for sha256, data in originals.items()
+        }
+        uploaded = {}
+        results = {}
+        for sha256, future in rendered.items():
+            try:
+                renditions, placeholder, (width, height) = future.result()
+            except Exception:
+                logger.warning("Could not render renditions of %s", sha256, exc_info=True)
+                continue
+            uploaded[sha256] = {
+                name: pool.submit(upload_rendition, data, rendition_public_id(sha256, name), folder)
+                for name, data in renditions.items()
+            }
+            results[sha256] = {'placeholder': placeholder, 'width': width, 'height': height}
+
+        public_ids = {}
+        for sha256, futures in uploaded.items():
+            done = {}
+            for name, future in futures.items():
+                try:
+                    done[name] = future.result()
+                except Exception:
+                    logger.warning("Could not upload %s rendition of %s", name, sha256, exc_info=True)
+            if len(done) < len(futures):
+                del results[sha256]
+                destroy_renditions(public_id for url, public_id in done.values())
+                continue
+            results[sha256].update({name: url for name, (url, public_id) in done.items()})
+            public_ids[sha256] = [public_id for url, public_id in done.values()]
+    return results, public_ids
+
+
+def read_upload(upload):
+    """Bytes of an uploaded file, rewound afterwards so the original is still stored"""
+    upload.seek(0)
+    data = upload.read()
+    upload.seek(0)
+    return data
+
+
+def apply_photo_renditions(validated_data, batch, current, fields, folder):
+    """
+    Set validated_data['photo_renditions'] for a create/update that may carry new photos
+    (the prepare step of save_with_photos; batch is its PhotoUploadBatch).
+    New uploads get the renditions stored with their content, rendered only when
+    there are none yet; cleared photos lose theirs, others keep current ones.
+    """
+    renditions = dict(current or {})
+    new = {}
+    for field in fields:
+        if field not in validated_data:
+            continue
+        renditions.pop(field, None)
+        # Only files are processed, not public ids / URLs given as strings
+        if field in batch.hashes:
+            new[field] = batch.hashes[field]
+
+    stored = stored_renditions(set(new.values()))
+    originals = {
+        sha256: read_upload(validated_data[field]) for field, sha256 in new.items() if sha256 not in stored
+    }
+    built, public_ids = build_renditions(originals, folder)
+    batch.add_renditions(built, public_ids)
+    stored.update(built)
+    renditions.update({field: stored[sha256] for field, sha256 in new.items() if sha256 in stored})
+    validated_data['photo_renditions'] = renditions
+    return renditions
@@ -0,0 +1,98 @@
+"""
+Cache of serialized QR scan responses
+
+Checkpoints scan the same vehicles over and over, so POST /api/vehicles/scan/
+keeps the VehicleSerializer payload per unique_id in the 'scan' cache alias.
+That alias is Django's local-memory cache by default (per process, LRU bounded
+by MAX_ENTRIES) and can point at a shared backend such as Redis through
+SCAN_CACHE_BACKEND / SCAN_CACHE_LOCATION. Entries expire after SCAN_CACHE_TTL
+seconds and are dropped whenever the vehicle is saved or deleted.
+
+Signals only reach the process that wrote the vehicle: with the local-memory
+backend a gunicorn worker never hears about saves made by another worker or by
+run_asset_worker, nor about queryset.update() calls. Each entry therefore keeps
+the vehicle's updated_at, and a hit is only served after a one-column lookup
+(by the unique_id index) confirms the row has not changed since. Code that
+bypasses save() must bump updated_at itself.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Vehicle
+
+SCAN_CACHE_ALIAS = 'scan'
+
+HITS_KEY = 'vehicle-scan:stats:hits'
+MISSES_KEY = 'vehicle-scan:stats:misses'
+
+
+def get_scan_cache():
+    return caches[SCAN_CACHE_ALIAS]
+
+
+def scan_cache_key(unique_id):
+    return f'vehicle-scan:{unique_id}'
+
+
+def _increment(cache, key):
+    """Counter increment that works on every backend (incr fails on a missing key)"""
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_scan_payload(unique_id, build_payload):
+    """
+    Return the cached scan payload for unique_id, building and caching it on a miss.
+    build_payload() returns (updated_at, serialized vehicle), or None if it does not
+    exist (misses for unknown ids are not cached). An entry whose updated_at no
+    longer matches the row is treated as a miss.
+    """
+    cache = get_scan_cache()
+    key = scan_cache_key(unique_id)
+    entry = cache.get(key)
+    if entry is not None:
+        updated_at = Vehicle.objects.filter(unique_id=unique_id).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            cache.delete(key)
+        elif updated_at == entry['updated_at']:
+            _increment(cache, HITS_KEY)
+            return entry['payload']
+
+    _increment(cache, MISSES_KEY)
+    built = build_payload()
+    if built is None:
+        return None
+    updated_at, payload = built
+    cache.set(key, {'updated_at': updated_at, 'payload': payload}, settings.SCAN_CACHE_TTL)
+    return payload
+
+
+def invalidate_scan_payload(unique_id):
+    get_scan_cache().delete(scan_cache_key(unique_id))
+
+
+def scan_cache_stats():
+    """Hit/miss counters (per process with the local-memory backend, global with a shared one)"""
+    cache = get_scan_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        'backend': settings.CACHES[SCAN_CACHE_ALIAS]['BACKEND'],
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / lookups, 4) if lookups else None,
+        'ttl_seconds': settings.SCAN_CACHE_TTL,
+    }
+
+
+@receiver(post_save, sender='vehicles.Vehicle')
+@receiver(post_delete, sender='vehicles.Vehicle')
+def invalidate_vehicle_scan_payload(sender, instance, **kwargs):
+    """Drop the cached scan payload whenever a vehicle changes or is deleted"""
+    invalidate_scan_payload(instance.unique_id)
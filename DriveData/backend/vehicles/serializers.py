@@ -1,11 +1,23 @@
+from functools import partial
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Vehicle, Owner
+from .models import Vehicle, Owner, UserProfile
+from .renditions import apply_photo_renditions
+from .photo_uploads import save_with_photos
+from .qr_codes import qr_code_url
+from .direct_uploads import DirectUploadError, is_upload_reference, resolve_upload_reference
 
 
 class OwnerSerializer(serializers.ModelSerializer):
     """Serializer for Owner model"""
 
+    def create(self, validated_data):
+        return save_with_photos(Owner, ('photo',), validated_data, None, super().create)
+
+    def update(self, instance, validated_data):
+        return save_with_photos(Owner, ('photo',), validated_data, instance, partial(super().update, instance))
+
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         if representation.get('photo'):
@@ -25,6 +37,9 @@ class OwnerSerializer(serializers.ModelSerializer):
 class VehicleSerializer(serializers.ModelSerializer):
     """Serializer for Vehicle model"""
 
+    # Uploaded photos that get WebP renditions (exposed as photo_renditions)
+    PHOTO_FIELDS = ('owner_photo', 'front_photo', 'back_photo', 'side_photo')
+
     # ✅ AUTO-ATTACH LOGGED-IN USER (FIXES ADD VEHICLE ERROR)
     owner = serializers.HiddenField(
         default=serializers.CurrentUserDefault()
@@ -35,22 +50,71 @@ class VehicleSerializer(serializers.ModelSerializer):
         read_only=True
     )
 
+    def __init__(self, *args, fields=None, **kwargs):
+        """fields: optional list of output names to keep (sparse fieldset)"""
+        super().__init__(*args, **kwargs)
+        self.selected_fields = fields
+        if fields is not None:
+            for name in set(self.fields) - set(fields) - {'owner'}:
+                self.fields.pop(name)
+
+    def to_internal_value(self, data):
+        """Photos may be direct upload references (see vehicles.direct_uploads) instead of files"""
+        references = {field: data[field] for field in self.PHOTO_FIELDS if is_upload_reference(data.get(field))}
+        if references:
+            # Resolved before the fields parse the value into a CloudinaryResource
+            user = getattr(self.context.get('request'), 'user', None)
+            data = data.copy()
+            errors = {}
+            for field, reference in references.items():
+                try:
+                    data[field] = resolve_upload_reference(reference, user)
+                except DirectUploadError as exc:
+                    errors[field] = [str(exc)]
+            if errors:
+                raise serializers.ValidationError(errors)
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        return save_with_photos(
+            Vehicle, self.PHOTO_FIELDS, validated_data, None, super().create, self.renditions_step(None)
+        )
+
+    def update(self, instance, validated_data):
+        return save_with_photos(
+            Vehicle, self.PHOTO_FIELDS, validated_data, instance,
+            partial(super().update, instance), self.renditions_step(instance)
+        )
+
+    def renditions_step(self, instance):
+        """Renders the WebP renditions of new photos while save_with_photos uploads them"""
+        return partial(
+            apply_photo_renditions, current=instance.photo_renditions if instance else {},
+            fields=self.PHOTO_FIELDS, folder='vehicle_photo_renditions'
+        )
+
     def to_representation(self, instance):
         representation = super().to_representation(instance)
 
         # Add owner ID to response (HiddenField doesn't include it by default)
-        representation['owner'] = instance.owner.id
+        if self.selected_fields is None or 'owner' in self.selected_fields:
+            representation['owner'] = instance.owner_id
 
         cloudinary_fields = [
             'owner_photo',
             'front_photo',
             'back_photo',
             'side_photo',
-            'qr_code',
             'logo'
         ]
 
+        # Rendered on request from unique_id rather than read from the stored asset
+        if 'qr_code' in representation:
+            representation['qr_code'] = qr_code_url(instance.unique_id, self.context.get('request'))
+
         for field in cloudinary_fields:
+            if field not in representation:
+                continue
             value = getattr(instance, field, None)
             # Check if field has a value and a URL
             if value and hasattr(value, 'url'):
@@ -92,9 +156,11 @@ class VehicleSerializer(serializers.ModelSerializer):
             'front_photo',
             'back_photo',
             'side_photo',
+            'photo_renditions',
 
             'qr_code',
             'logo',
+            'asset_status',
 
             'created_at',
             'updated_at',
@@ -105,12 +171,28 @@ class VehicleSerializer(serializers.ModelSerializer):
             'unique_id',
             'qr_code',
             'logo',
+            'asset_status',
+            'photo_renditions',
             'created_at',
             'updated_at',
             'owner_username',
         ]
 
 
+class VehicleRenewalSerializer(serializers.Serializer):
+    """One entry of a batch document renewal: vehicle id plus the new expiry date(s)"""
+    id = serializers.IntegerField()
+    insurance_expiry = serializers.DateField(required=False)
+    pollution_certificate_expiry = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if 'insurance_expiry' not in attrs and 'pollution_certificate_expiry' not in attrs:
+            raise serializers.ValidationError(
+                "Give insurance_expiry, pollution_certificate_expiry or both."
+            )
+        return attrs
+
+
 class VehicleScanSerializer(serializers.Serializer):
     """Serializer for QR code scanning"""
     unique_id = serializers.UUIDField()
@@ -174,8 +256,17 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         )
 
         if photo:
-            user.profile.photo = photo
-            user.profile.save()
+            profile = user.profile
+
+            def save_profile(data):
+                profile.photo = data['photo']
+                profile.photo_renditions = data['photo_renditions']
+                profile.save()
+
+            save_with_photos(
+                UserProfile, ('photo',), {'photo': photo}, profile, save_profile,
+                partial(apply_photo_renditions, current={}, fields=('photo',), folder='user_photo_renditions')
+            )
 
         return user
 
@@ -196,10 +287,12 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'first_name',
             'last_name',
             'photo',
+            'photo_renditions',
             'phone',
             'bio',
         ]
         read_only_fields = [
+            'photo_renditions',
             'username',
             'email',
             'first_name',
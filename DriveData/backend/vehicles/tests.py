@@ -0,0 +1,415 @@
+from datetime import date, timedelta
+from io import BytesIO
+from unittest import mock
+
+import cloudinary
+import cloudinary.uploader
+from cloudinary import CloudinaryResource
+from cloudinary.utils import api_sign_request
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from .asset_jobs import run_job
+from .models import AssetJob, MediaAsset, Vehicle
+from .photo_uploads import PhotoUploadBatch
+from .query_plans import check_endpoint, create_sample_data, endpoint_cases, grow_sample_data, prefer_indexes
+from .scan_cache import get_scan_cache
+
+
+def make_vehicles(owner, count, prefix='T', **fields):
+    """bulk_create count vehicles of owner (derived columns filled in like save() would)"""
+    expiry = fields.pop('expiry', date.today() + timedelta(days=100))
+    vehicles = []
+    for i in range(count):
+        vehicle = Vehicle(
+            owner=owner, registration_number=f'{prefix}{i:05d}', make='Tata', model='Nexon', year=2020,
+            color='red', fuel_type='petrol', engine_number='E', chassis_number='C',
+            insurance_expiry=expiry, pollution_certificate_expiry=expiry, registration_date=date(2020, 1, 1),
+            asset_status=Vehicle.ASSET_READY, **fields,
+        )
+        vehicle.refresh_derived_fields()
+        vehicles.append(vehicle)
+    return Vehicle.objects.bulk_create(vehicles)
+
+
+def walk_pages(client, url, key='results'):
+    """Follow 'next' links from url; returns (rows, number of pages)"""
+    rows, pages = [], 0
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200, response.content
+        data = response.json()
+        rows.extend(data[key])
+        pages += 1
+        url = data['next']
+        assert pages < 100, 'pagination does not advance'
+    return rows, pages
+
+
+class CursorPaginationTiesTests(TestCase):
+    """Cursors hold every ordering column, so long runs of equal values can't stall them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+        # More ties than DRF's CursorPagination offset_cutoff (1000)
+        cls.vehicles = make_vehicles(cls.staff, 1500)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_expiry_list_walks_past_1000_equal_dates(self):
+        rows, pages = walk_pages(self.client, '/api/dashboard/expiries/?page_size=200')
+        ids = [row['id'] for row in rows]
+        self.assertEqual(pages, 8)
+        self.assertEqual(len(ids), 1500)
+        self.assertEqual(ids, sorted(vehicle.pk for vehicle in self.vehicles))
+
+    def test_previous_link_returns_the_previous_page(self):
+        first = self.client.get('/api/dashboard/expiries/?page_size=200').json()
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual([row['id'] for row in back['results']], [row['id'] for row in first['results']])
+        self.assertIsNone(back['previous'])
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.client.get('/api/dashboard/expiries/?cursor=bogus').status_code, 404)
+
+
+class AdminUserListTiesTests(TestCase):
+    """The admin user list pages through more than 1000 users with the same vehicle count"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+        User.objects.bulk_create(User(username=f'user{i:05d}') for i in range(1100))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_vehicle_count_ordering_walks_past_1000_ties(self):
+        rows, pages = walk_pages(self.client, '/api/admin/users/?ordering=vehicle_count&page_size=200', key='users')
+        ids = [row['id'] for row in rows]
+        self.assertEqual(pages, 6)
+        self.assertEqual(ids, sorted(User.objects.values_list('id', flat=True)))
+
+    def test_descending_previous_link(self):
+        first = self.client.get('/api/admin/users/?ordering=-vehicle_count&page_size=200').json()
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual([row['id'] for row in back['users']], [row['id'] for row in first['users']])
+
+    def test_count_only_on_first_page(self):
+        first = self.client.get('/api/admin/users/?page_size=200').json()
+        self.assertEqual(first['count'], User.objects.count())
+        with self.assertNumQueries(1):
+            second = self.client.get(first['next']).json()
+        self.assertIsNone(second['count'])
+
+
+class ScanCacheTests(TestCase):
+    """Cached scan payloads are revalidated against the vehicle's updated_at"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@example.com', 'pw')
+        cls.vehicle = make_vehicles(cls.owner, 1)[0]
+
+    def setUp(self):
+        get_scan_cache().clear()
+        self.client = APIClient()
+
+    def scan(self):
+        response = self.client.post('/api/vehicles/scan/', {'unique_id': str(self.vehicle.unique_id)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_hit_costs_one_lookup(self):
+        self.scan()
+        with self.assertNumQueries(1):
+            self.scan()
+
+    def test_qr_code_url_follows_each_scanner_origin(self):
+        path = f'/api/qr/{self.vehicle.unique_id}.svg'
+        self.assertEqual(self.scan()['qr_code'], f'http://testserver{path}')
+        response = self.client.post(
+            '/api/vehicles/scan/?fields=qr_code', {'unique_id': str(self.vehicle.unique_id)},
+            format='json', secure=True, HTTP_HOST='localhost',
+        )
+        self.assertEqual(response.json(), {'qr_code': f'https://localhost{path}'})
+
+    def test_update_without_signal_is_not_served_stale(self):
+        # What another process's write looks like to this process's cache
+        self.assertEqual(self.scan()['color'], 'red')
+        Vehicle.objects.filter(pk=self.vehicle.pk).update(color='blue', updated_at=timezone.now())
+        self.assertEqual(self.scan()['color'], 'blue')
+
+    def test_deleted_vehicle_is_evicted(self):
+        self.scan()
+        Vehicle.objects.filter(pk=self.vehicle.pk).delete()
+        response = self.client.post('/api/vehicles/scan/', {'unique_id': str(self.vehicle.unique_id)}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_permanently_failed_asset_job_refreshes_payload(self):
+        self.scan()
+        job = AssetJob.objects.create(vehicle=self.vehicle, attempts=1, max_attempts=1, status=AssetJob.RUNNING)
+        with mock.patch.object(Vehicle, 'generate_assets', side_effect=RuntimeError('upload failed')):
+            self.assertFalse(run_job(job))
+        self.assertEqual(self.scan()['asset_status'], Vehicle.ASSET_FAILED)
+
+
+def jpeg_bytes(color):
+    buffer = BytesIO()
+    Image.new('RGB', (64, 48), color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class FakeCloudinary:
+    """Records uploads and deletions in place of cloudinary.uploader"""
+
+    def __init__(self, fail_originals=False):
+        self.fail_originals = fail_originals
+        self.originals = 0
+        self.renditions = []
+        self.destroyed = []
+
+    def upload_resource(self, file, **options):
+        if self.fail_originals:
+            raise RuntimeError('upload failed')
+        self.originals += 1
+        return CloudinaryResource(f'photo{self.originals}', version=1, format='jpg', type='upload', resource_type='image')
+
+    def upload(self, file, **options):
+        public_id = f"{options['folder']}/{options['public_id']}"
+        self.renditions.append(public_id)
+        return {'secure_url': f'https://res.cloudinary.com/demo/image/upload/{public_id}.webp', 'public_id': public_id}
+
+    def destroy(self, public_id, **options):
+        self.destroyed.append(public_id)
+
+    def patch(self, test):
+        for name in ('upload_resource', 'upload', 'destroy'):
+            patcher = mock.patch.object(cloudinary.uploader, name, getattr(self, name))
+            patcher.start()
+            test.addCleanup(patcher.stop)
+        return self
+
+
+class PhotoRenditionStorageTests(TestCase):
+    """Renditions are stored once per photo content and deleted with it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@example.com', 'pw')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        patcher = mock.patch.object(cloudinary.config(), 'cloud_name', 'demo')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_vehicle(self, number, photo):
+        data = {
+            'registration_number': number, 'make': 'Tata', 'model': 'Nexon', 'year': 2020, 'color': 'red',
+            'fuel_type': 'petrol', 'engine_number': 'E', 'chassis_number': 'C', 'insurance_expiry': '2030-01-01',
+            'pollution_certificate_expiry': '2030-01-01', 'registration_date': '2020-01-01',
+            'front_photo': SimpleUploadedFile('front.jpg', photo, 'image/jpeg'),
+        }
+        return self.client.post('/api/vehicles/', data, format='multipart')
+
+    def test_stored_photo_reuses_its_renditions(self):
+        storage = FakeCloudinary().patch(self)
+        first = self.create_vehicle('A1', jpeg_bytes('red')).json()
+        rendered = list(storage.renditions)
+        second = self.create_vehicle('A2', jpeg_bytes('red')).json()
+
+        self.assertEqual((storage.originals, storage.renditions), (1, rendered))
+        self.assertEqual(second['photo_renditions'], first['photo_renditions'])
+        self.assertEqual(sorted(MediaAsset.objects.get().rendition_ids), sorted(rendered))
+
+    def test_renditions_are_deleted_with_the_last_reference(self):
+        storage = FakeCloudinary().patch(self)
+        self.create_vehicle('A1', jpeg_bytes('red'))
+        self.create_vehicle('A2', jpeg_bytes('red'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Vehicle.objects.get(registration_number='A1').delete()
+        self.assertEqual(storage.destroyed, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Vehicle.objects.get(registration_number='A2').delete()
+        self.assertEqual(sorted(storage.destroyed), sorted(['photo1'] + storage.renditions))
+
+    def test_failed_save_deletes_renditions(self):
+        storage = FakeCloudinary().patch(self)
+        with mock.patch.object(Vehicle, 'save', side_effect=RuntimeError('database down')):
+            with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError):
+                self.create_vehicle('A1', jpeg_bytes('red'))
+        self.assertTrue(storage.renditions)
+        self.assertEqual(sorted(storage.destroyed), sorted(['photo1'] + storage.renditions))
+        self.assertFalse(MediaAsset.objects.exists())
+
+    def test_failed_upload_deletes_renditions(self):
+        storage = FakeCloudinary(fail_originals=True).patch(self)
+        response = self.create_vehicle('A1', jpeg_bytes('red'))
+        self.assertEqual(response.status_code, 502)
+        self.assertTrue(storage.renditions)
+        self.assertEqual(sorted(storage.destroyed), sorted(storage.renditions))
+
+    def test_failed_batch_start_releases_references(self):
+        FakeCloudinary().patch(self)
+        self.create_vehicle('A1', jpeg_bytes('red'))
+        photo = SimpleUploadedFile('front.jpg', jpeg_bytes('red'), 'image/jpeg')
+        broken = mock.Mock(chunks=mock.Mock(side_effect=OSError('read failed')))
+        with self.assertRaises(OSError):
+            PhotoUploadBatch(Vehicle, {'front_photo': photo, 'back_photo': broken})
+        self.assertEqual(MediaAsset.objects.get().ref_count, 1)
+
+
+class DashboardStatsQueryTests(TestCase):
+    """GET /api/dashboard/stats/ keeps its query budget: 2 for a 200, 1 for a 304"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@example.com', 'pw')
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+        make_vehicles(cls.owner, 3)
+        make_vehicles(cls.staff, 2, prefix='S', expiry=date.today() - timedelta(days=1))
+
+    def get_stats(self, user, **headers):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get('/api/dashboard/stats/', **headers)
+
+    def test_owner_stats_cost_two_queries(self):
+        with self.assertNumQueries(2):
+            response = self.get_stats(self.owner)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_vehicles'], 3)
+        self.assertEqual(response.json()['expired_count'], 0)
+
+    def test_staff_stats_cost_two_queries(self):
+        with self.assertNumQueries(2):
+            response = self.get_stats(self.staff)
+        self.assertEqual(response.json()['total_vehicles'], 5)
+        self.assertEqual(response.json()['expired_count'], 2)
+
+    def test_unchanged_stats_are_a_one_query_304(self):
+        etag = self.get_stats(self.owner)['ETag']
+        with self.assertNumQueries(1):
+            response = self.get_stats(self.owner, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class QueryPlanTests(TestCase):
+    """List, search and dashboard queries are served by indexes, with constant query counts"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner, staff, vehicle = create_sample_data()
+        cls.cases = endpoint_cases(cls.owner, staff, vehicle)
+
+    def setUp(self):
+        prefer_indexes()
+        get_scan_cache().clear()
+
+    def test_no_table_scans_or_sorts(self):
+        for case in self.cases:
+            with self.subTest(case[0]):
+                status_code, count, plans = check_endpoint(*case)
+                self.assertLess(status_code, 400)
+                self.assertEqual([(sql, problems) for sql, plan, problems in plans if problems], [])
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        before = {case[0]: check_endpoint(*case, explain=False)[1] for case in self.cases}
+        grow_sample_data(self.owner)
+        for case in self.cases:
+            with self.subTest(case[0]):
+                self.assertLessEqual(check_endpoint(*case, explain=False)[1], before[case[0]])
+
+
+@override_settings(DIRECT_UPLOAD_BACKEND='cloudinary')
+class CloudinaryDirectUploadTests(TestCase):
+    """A Cloudinary direct upload is only accepted with Cloudinary's signed upload response"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@example.com', 'pw')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        config = cloudinary.config()
+        for name, value in (('cloud_name', 'demo'), ('api_key', 'key'), ('api_secret', 'secret')):
+            patcher = mock.patch.object(config, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        response = self.client.post('/api/uploads/sign/', {'content_type': 'image/jpeg'}, format='json')
+        self.target = response.json()['uploads'][0]
+        self.public_id = self.target['fields']['public_id']
+
+    def upload_response(self, version=1700000000, public_id=None):
+        public_id = public_id or self.public_id
+        signature = api_sign_request({'public_id': public_id, 'version': version}, 'secret', signature_version=1)
+        return {'reference': self.target['reference'], 'public_id': public_id, 'version': version, 'signature': signature}
+
+    def create_vehicle(self, front_photo):
+        data = {
+            'registration_number': 'D1', 'make': 'Tata', 'model': 'Nexon', 'year': 2020, 'color': 'red',
+            'fuel_type': 'petrol', 'engine_number': 'E', 'chassis_number': 'C', 'insurance_expiry': '2030-01-01',
+            'pollution_certificate_expiry': '2030-01-01', 'registration_date': '2020-01-01',
+            'front_photo': front_photo,
+        }
+        return self.client.post('/api/vehicles/', data, format='json')
+
+    def test_verified_upload_is_stored_with_its_version(self):
+        response = self.create_vehicle(self.upload_response())
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(str(Vehicle.objects.get().front_photo.version), '1700000000')
+        self.assertIn(f'/v1700000000/{self.public_id}', response.json()['front_photo'])
+
+    def test_bare_reference_is_rejected(self):
+        response = self.create_vehicle(self.target['reference'])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('front_photo', response.json())
+
+    def test_forged_signature_is_rejected(self):
+        upload = dict(self.upload_response(), signature='0' * 40)
+        self.assertEqual(self.create_vehicle(upload).status_code, 400)
+
+    def test_response_for_another_upload_is_rejected(self):
+        upload = self.upload_response(public_id='vehicle_photos/direct/someone-else')
+        self.assertEqual(self.create_vehicle(upload).status_code, 400)
+        self.assertFalse(Vehicle.objects.exists())
+
+
+class DashboardAlertsSummaryOrderTests(TestCase):
+    """Alert buckets list vehicles newest first, like Vehicle's default ordering"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', 'owner@example.com', 'pw')
+        today = date.today()
+        # Created in order of decreasing urgency, so expiry order and creation order differ
+        cls.vehicles = []
+        for days in (-3, -1, 2, 5, 10, 20):
+            cls.vehicles += make_vehicles(cls.owner, 1, prefix=f'A{days + 10:02d}', expiry=today + timedelta(days=days))
+
+    def test_buckets_are_newest_first(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        summary = client.get('/api/dashboard/alerts-summary/').json()
+        numbers = {
+            bucket: [row['vehicle_number'] for row in summary[bucket]]
+            for bucket in ('expiring_this_week', 'expiring_this_month', 'already_expired')
+        }
+        self.assertEqual(numbers, {
+            'expiring_this_week': ['A1500000', 'A1200000'],
+            'expiring_this_month': ['A3000000', 'A2000000'],
+            'already_expired': ['A0900000', 'A0700000'],
+        })
@@ -1,6 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import VehicleViewSet, OwnerViewSet, UserRegistrationView, get_user_profile
+from .views import (
+    VehicleViewSet,
+    OwnerViewSet,
+    UserRegistrationView,
+    get_user_profile,
+    sign_direct_uploads,
+    direct_upload_local,
+    vehicle_qr_code
+)
 from .dashboard_views import (
     DashboardStatsView,
     ExpiryAlertsView,
@@ -10,11 +18,13 @@ from .dashboard_views import (
 from .admin_auth import admin_login
 from .admin_views import (
     admin_get_all_vehicles,
+    admin_export_vehicles,
     admin_get_all_users,
     admin_verify_vehicle,
     admin_blacklist_vehicle,
     admin_delete_vehicle,
-    admin_dashboard_stats
+    admin_dashboard_stats,
+    admin_scan_cache_stats
 )
 
 router = DefaultRouter()
@@ -27,6 +37,13 @@ urlpatterns = [
     # User registration and profile
     path('register/', UserRegistrationView.as_view(), name='user-register'),
     path('profile/', get_user_profile, name='user-profile'),
+
+    # Direct-to-storage photo uploads
+    path('uploads/sign/', sign_direct_uploads, name='direct-upload-sign'),
+    path('uploads/local/<str:token>/', direct_upload_local, name='direct-upload-local'),
+
+    # QR codes rendered on request
+    path('qr/<uuid:unique_id>.<str:image_format>', vehicle_qr_code, name='vehicle-qr-code'),
     
     # Dashboard endpoints
     path('dashboard/stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
@@ -38,8 +55,10 @@ urlpatterns = [
     path('admin/login/', admin_login, name='admin-login'),
     path('admin/stats/', admin_dashboard_stats, name='admin-dashboard-stats'),
     path('admin/vehicles/', admin_get_all_vehicles, name='admin-vehicles'),
+    path('admin/vehicles/export/', admin_export_vehicles, name='admin-export-vehicles'),
     path('admin/users/', admin_get_all_users, name='admin-users'),
     path('admin/vehicles/<int:pk>/verify/', admin_verify_vehicle, name='admin-verify-vehicle'),
     path('admin/vehicles/<int:pk>/blacklist/', admin_blacklist_vehicle, name='admin-blacklist-vehicle'),
     path('admin/vehicles/<int:pk>/delete/', admin_delete_vehicle, name='admin-delete-vehicle'),
+    path('admin/scan-cache/', admin_scan_cache_stats, name='admin-scan-cache-stats'),
 ]
@@ -1,14 +1,31 @@
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils import timezone
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_safe
 from rest_framework import viewsets, status, generics
-from rest_framework.decorators import action, api_view, permission_classes as permission_classes_decorator
+from rest_framework.decorators import action, api_view, parser_classes, permission_classes as permission_classes_decorator
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.parsers import MultiPartParser
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from django.shortcuts import get_object_or_404
-from .models import Vehicle, Owner, UserProfile
-from .serializers import VehicleSerializer, OwnerSerializer, VehicleScanSerializer, UserRegistrationSerializer, UserProfileSerializer
+from .models import Vehicle, Owner, UserProfile, normalize_registration_number
+from .serializers import (
+    VehicleSerializer, OwnerSerializer, VehicleRenewalSerializer, VehicleScanSerializer,
+    UserRegistrationSerializer, UserProfileSerializer
+)
 from .permissions import IsVehicleOwner
 from .admin_authentication import AdminJWTAuthentication
+from .scan_cache import get_scan_payload, invalidate_scan_payload
+from .db_routing import ReadReplicaMixin
+from .conditional import conditional_get
+from .read_serializers import VehicleRowSerializer, model_columns, requested_fields, value_columns
+from .importers import IMPORT_FORMATS, decode_lines, guess_format, import_vehicles
+from .direct_uploads import ALLOWED_CONTENT_TYPES, DirectUploadError, issue_upload_target, store_local_upload
+from .qr_codes import QR_CACHE_CONTROL, QR_CONTENT_TYPES, qr_code_etag, qr_code_size, render_qr_code
 
 
 class OwnerViewSet(viewsets.ModelViewSet):
@@ -17,11 +34,42 @@ class OwnerViewSet(viewsets.ModelViewSet):
     serializer_class = OwnerSerializer
 
 
-class VehicleViewSet(viewsets.ModelViewSet):
+def vehicle_validators(request, pk=None, **kwargs):
+    """Conditional GET validators of one vehicle: a primary key lookup, no serialization"""
+    try:
+        row = Vehicle.objects.filter(pk=pk).values_list('updated_at', 'owner__username').first()
+    except (TypeError, ValueError):
+        return None
+    if row is None:
+        return None
+    updated_at, owner_username = row
+    # The full path tells ?fields= projections of the same vehicle apart
+    return ('vehicle', request.get_full_path(), updated_at, owner_username), updated_at
+
+
+def profile_validators(request, **kwargs):
+    """Conditional GET validators of the profile: user fields plus the profile's updated_at"""
+    user = request.user
+    profile_updated_at = UserProfile.objects.filter(user=user).values_list('updated_at', flat=True).first()
+    return (
+        'profile', user.pk, user.username, user.email, user.first_name, user.last_name, profile_updated_at
+    ), None
+
+
+class VehicleViewSet(ReadReplicaMixin, viewsets.ModelViewSet):
     """ViewSet for managing vehicles - user can only access their own vehicles"""
     serializer_class = VehicleSerializer
     permission_classes = [IsAuthenticated, IsVehicleOwner]
 
+    # Upper bound on rows returned by the registry search action
+    SEARCH_MAX_RESULTS = 50
+    # Upper bound on vehicles per batch renewal request
+    RENEWAL_MAX_VEHICLES = 500
+
+    def use_read_replica(self, request):
+        """List, retrieve, search and the (POST but read-only) QR scan read from a replica"""
+        return super().use_read_replica(request) or self.action == 'scan_qr'
+
     def get_queryset(self):
         """
         Return all vehicles in the registry for list view (search functionality).
@@ -29,7 +77,21 @@ class VehicleViewSet(viewsets.ModelViewSet):
         Write permissions (edit/delete) are controlled by IsVehicleOwner permission.
         """
         # All authenticated users can see all vehicles for registry search
-        return Vehicle.objects.all().select_related('owner')
+        queryset = Vehicle.objects.all().select_related('owner')
+        if self.action == 'retrieve':
+            # Sparse fieldset: load only the columns the response needs
+            fields = requested_fields(self.request)
+            if fields is not None:
+                queryset = queryset.only(*model_columns(fields))
+                if 'owner_username' not in fields:
+                    queryset = queryset.select_related(None)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        """Detail responses honour ?fields= / ?exclude= as well"""
+        if self.action == 'retrieve':
+            kwargs.setdefault('fields', requested_fields(self.request))
+        return super().get_serializer(*args, **kwargs)
 
     def get_object(self):
         """
@@ -50,6 +112,29 @@ class VehicleViewSet(viewsets.ModelViewSet):
         
         return obj
 
+    def list(self, request, *args, **kwargs):
+        """
+        GET /api/vehicles/ - registry list.
+        Read-only, so rows are read with .values() and serialized by VehicleRowSerializer
+        (same JSON as VehicleSerializer, without the per-row model/field overhead).
+        ?fields=a,b or ?exclude=a,b narrows both the response and the columns read.
+        """
+        fields = requested_fields(request)
+        serializer = VehicleRowSerializer(fields, request)
+        queryset = self.filter_queryset(self.get_queryset()).values(*value_columns(fields))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.many(page))
+        return Response(serializer.many(queryset))
+
+    @conditional_get(vehicle_validators)
+    def retrieve(self, request, *args, **kwargs):
+        """
+        GET /api/vehicles/{id}/ - answers 304 while the vehicle is unchanged.
+        Supports ?fields= / ?exclude= (columns deferred with .only()).
+        """
+        return super().retrieve(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """
         Automatically assign the authenticated user as owner when creating a vehicle.
@@ -71,27 +156,191 @@ class VehicleViewSet(viewsets.ModelViewSet):
         """
         instance.delete()
 
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def import_vehicles(self, request):
+        """
+        Bulk import vehicles owned by the current user.
+        POST /api/vehicles/import/ (multipart)
+        Form: file=<vehicles.csv | vehicles.ndjson>, file_format=csv|ndjson (optional, from the file name)
+
+        Columns / keys are VehicleSerializer fields. Valid rows are inserted even when
+        others fail; logos are queued for the asset worker.
+        Returns {"created": n, "failed": n, "errors": [{"line": n, "errors": {...}}]}.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'error': 'Upload the CSV or NDJSON file as "file"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        file_format = request.data.get('file_format') or guess_format(upload.name)
+        if file_format not in IMPORT_FORMATS:
+            return Response(
+                {'error': f"file_format must be one of {', '.join(IMPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Iterating the upload yields one line at a time (spooled to disk when large)
+        report = import_vehicles(decode_lines(upload), file_format, request.user)
+        return Response(report, status=status.HTTP_201_CREATED if report['created'] else status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['patch'], url_path='renewals')
+    def renew_documents(self, request):
+        """
+        Batch document renewal, e.g. after an insurer renews a fleet policy.
+        PATCH /api/vehicles/renewals/
+        Body: [{"id": 1, "insurance_expiry": "2027-03-31", "pollution_certificate_expiry": "2027-01-15"}, ...]
+
+        Either date may be omitted per entry. Permissions are checked for the whole
+        set from one query, and only the expiry columns (plus the derived ones and
+        updated_at) are written, with one bulk_update in one transaction: all
+        entries are applied or none.
+        """
+        if not isinstance(request.data, list) or not request.data:
+            return Response(
+                {'error': 'Send a non-empty JSON list of {id, insurance_expiry, pollution_certificate_expiry}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(request.data) > self.RENEWAL_MAX_VEHICLES:
+            return Response(
+                {'error': f'At most {self.RENEWAL_MAX_VEHICLES} vehicles per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = VehicleRenewalSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        renewals = {entry['id']: entry for entry in serializer.validated_data}
+        if len(renewals) != len(serializer.validated_data):
+            return Response({'error': 'Each vehicle id may appear only once'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # One query for the whole set; the owner join lets IsVehicleOwner run in memory
+        vehicles = list(
+            Vehicle.objects.filter(pk__in=renewals).select_related('owner').only(
+                'id', 'unique_id', 'insurance_expiry', 'pollution_certificate_expiry', 'owner__id'
+            )
+        )
+        missing = sorted(set(renewals) - {vehicle.pk for vehicle in vehicles})
+        if missing:
+            raise NotFound(f"Vehicle(s) not found: {', '.join(map(str, missing))}")
+        denied = []
+        for vehicle in vehicles:
+            try:
+                self.check_object_permissions(request, vehicle)
+            except PermissionDenied:
+                denied.append(vehicle.pk)
+        if denied:
+            raise PermissionDenied(
+                f"You do not have permission to modify vehicle(s): {', '.join(map(str, sorted(denied)))}"
+            )
+
+        # bulk_update skips save(): derived columns and updated_at are set here
+        now = timezone.now()
+        for vehicle in vehicles:
+            entry = renewals[vehicle.pk]
+            vehicle.insurance_expiry = entry.get('insurance_expiry', vehicle.insurance_expiry)
+            vehicle.pollution_certificate_expiry = entry.get(
+                'pollution_certificate_expiry', vehicle.pollution_certificate_expiry
+            )
+            vehicle.refresh_expiry_fields()
+            vehicle.updated_at = now
+        with transaction.atomic():
+            Vehicle.objects.bulk_update(vehicles, [
+                'insurance_expiry', 'pollution_certificate_expiry', 'next_expiry_date', 'expiry_status', 'updated_at'
+            ])
+            # post_save doesn't fire either: drop the cached scan payloads ourselves
+            unique_ids = [vehicle.unique_id for vehicle in vehicles]
+            transaction.on_commit(lambda: [invalidate_scan_payload(unique_id) for unique_id in unique_ids])
+
+        return Response({
+            'updated': len(vehicles),
+            'vehicles': [{
+                'id': vehicle.pk,
+                'insurance_expiry': vehicle.insurance_expiry,
+                'pollution_certificate_expiry': vehicle.pollution_certificate_expiry,
+                'next_expiry_date': vehicle.next_expiry_date,
+                'expiry_status': vehicle.expiry_status,
+                'updated_at': vehicle.updated_at,
+            } for vehicle in sorted(vehicles, key=lambda vehicle: vehicle.pk)]
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        """
+        Search the registry by registration number.
+        GET /api/vehicles/search/?q=MH01AB&match=prefix[&fields=id,registration_number]
+
+        match: 'prefix' (default) or 'exact'. The query is normalized the same way
+        as Vehicle.registration_number_normalized, so 'mh-01 ab' finds 'MH01AB1234'.
+        Both modes are range lookups on the normalized index, never a table scan.
+        """
+        query = normalize_registration_number(request.query_params.get('q', ''))
+        match = request.query_params.get('match', 'prefix')
+        if not query:
+            return Response(
+                {'error': 'Query parameter "q" is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if match not in ('prefix', 'exact'):
+            return Response(
+                {'error': 'match must be "prefix" or "exact"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limit = min(int(request.query_params.get('limit', self.SEARCH_MAX_RESULTS)), self.SEARCH_MAX_RESULTS)
+        except ValueError:
+            limit = self.SEARCH_MAX_RESULTS
+
+        vehicles = self.get_queryset()
+        if match == 'exact':
+            vehicles = vehicles.filter(registration_number_normalized=query)
+        else:
+            # [query, query-with-last-char-bumped) is the same set as LIKE 'query%'
+            # but stays an index range scan on every backend and collation
+            upper_bound = query[:-1] + chr(ord(query[-1]) + 1)
+            vehicles = vehicles.filter(
+                registration_number_normalized__gte=query,
+                registration_number_normalized__lt=upper_bound,
+            )
+        fields = requested_fields(request)
+        vehicles = vehicles.order_by('registration_number_normalized').values(*value_columns(fields))[:max(limit, 1)]
+
+        return Response(VehicleRowSerializer(fields, request).many(vehicles), status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['post'], url_path='scan', permission_classes=[AllowAny])
     def scan_qr(self, request):
         """
         Public endpoint to retrieve vehicle information by scanning QR code.
-        POST /api/vehicles/scan/
+        POST /api/vehicles/scan/[?fields=registration_number,owner_name]
         Body: {"unique_id": "uuid-string"}
         
         Note: This is intentionally public to allow QR code scanning without authentication.
         """
+        fields = requested_fields(request)
         serializer = VehicleScanSerializer(data=request.data)
         if serializer.is_valid():
             unique_id = serializer.validated_data['unique_id']
-            try:
-                vehicle = get_object_or_404(Vehicle, unique_id=unique_id)
-                vehicle_serializer = VehicleSerializer(vehicle)
-                return Response(vehicle_serializer.data, status=status.HTTP_200_OK)
-            except Vehicle.DoesNotExist:
+
+            def build_payload():
+                row = Vehicle.objects.filter(unique_id=unique_id).values(*value_columns()).first()
+                if row is None:
+                    return None
+                # Without the request: qr_code stays a relative path, so the cached
+                # payload doesn't carry the scheme and host of whoever filled it
+                return row['updated_at'], VehicleRowSerializer().to_representation(row)
+
+            # Served from the scan cache while the vehicle's updated_at is unchanged
+            payload = get_scan_payload(unique_id, build_payload)
+            if payload is None:
                 return Response(
                     {'error': 'Vehicle not found with this QR code'}, 
                     status=status.HTTP_404_NOT_FOUND
                 )
+            if fields is not None:
+                # The cached full payload is projected rather than cached per fieldset
+                payload = {name: payload[name] for name in fields}
+            if payload.get('qr_code'):
+                payload = {**payload, 'qr_code': request.build_absolute_uri(payload['qr_code'])}
+            return Response(payload, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=['get'], url_path='download-logo')
@@ -127,20 +376,114 @@ class UserRegistrationView(generics.CreateAPIView):
                 'email': user.email,
                 'first_name': user.first_name,
                 'last_name': user.last_name,
-                'photo': request.build_absolute_uri(user.profile.photo.url) if user.profile.photo else None
+                'photo': request.build_absolute_uri(user.profile.photo.url) if user.profile.photo else None,
+                'photo_renditions': user.profile.photo_renditions.get('photo')
             }
         }, status=status.HTTP_201_CREATED)
 
 
 @api_view(['GET'])
 @permission_classes_decorator([IsAuthenticated])
+@conditional_get(profile_validators)
 def get_user_profile(request):
-    """Get current user's profile including photo"""
+    """Get current user's profile including photo (304 while unchanged)"""
     user = request.user
     return Response({
         'username': user.username,
         'email': user.email,
         'first_name': user.first_name,
         'last_name': user.last_name,
-        'photo': request.build_absolute_uri(user.profile.photo.url) if user.profile.photo else None
+        'photo': request.build_absolute_uri(user.profile.photo.url) if user.profile.photo else None,
+        'photo_renditions': user.profile.photo_renditions.get('photo')
     })
+
+
+# Upload targets issued per sign request
+DIRECT_UPLOAD_MAX_TARGETS = 4
+
+
+@api_view(['POST'])
+@permission_classes_decorator([IsAuthenticated])
+def sign_direct_uploads(request):
+    """
+    Issue short-lived upload targets so photos go straight to storage.
+    POST /api/uploads/sign/
+    Body: {"content_type": "image/jpeg", "count": 1}
+
+    Upload each file to its target (multipart POST of target.fields plus the file),
+    then send target.reference as the photo field of POST/PATCH /api/vehicles/.
+    With the cloudinary backend, send {"reference", "public_id", "version",
+    "signature"} instead, the last three from Cloudinary's upload response.
+    """
+    content_type = request.data.get('content_type')
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        return Response(
+            {'error': f"content_type must be one of {', '.join(ALLOWED_CONTENT_TYPES)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        count = int(request.data.get('count', 1))
+    except (TypeError, ValueError):
+        count = 0
+    if not 1 <= count <= DIRECT_UPLOAD_MAX_TARGETS:
+        return Response(
+            {'error': f'count must be between 1 and {DIRECT_UPLOAD_MAX_TARGETS}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    return Response({
+        'backend': settings.DIRECT_UPLOAD_BACKEND,
+        'max_bytes': settings.DIRECT_UPLOAD_MAX_BYTES,
+        'uploads': [issue_upload_target(request, content_type) for _ in range(count)],
+    }, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes_decorator([AllowAny])
+@parser_classes([MultiPartParser])
+def direct_upload_local(request, token):
+    """
+    Local stand-in for a storage upload target (DIRECT_UPLOAD_BACKEND=local).
+    POST /api/uploads/local/{token}/ multipart file=<photo>
+    The signed token is the authorization, like a pre-signed storage URL.
+    """
+    if settings.DIRECT_UPLOAD_BACKEND != 'local':
+        raise NotFound('Local uploads are disabled')
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'Upload the photo as "file"'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        name = store_local_upload(token, upload)
+    except DirectUploadError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'name': name}, status=status.HTTP_201_CREATED)
+
+
+@require_safe
+@gzip_page
+def vehicle_qr_code(request, unique_id, image_format):
+    """
+    QR code of a vehicle, rendered on request (see vehicles.qr_codes).
+    GET /api/qr/{unique_id}.svg or /api/qr/{unique_id}.png[?size=512]
+
+    Public and without a database query: the image only encodes unique_id, which
+    the scan endpoint already treats as the key. Plain Django view, so any Accept
+    header an <img> tag sends is fine.
+    """
+    if image_format not in QR_CONTENT_TYPES:
+        raise Http404('QR codes are available as .svg or .png')
+    try:
+        size = qr_code_size(image_format, request.GET.get('size'))
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    etag = qr_code_etag(unique_id, image_format, size)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(
+            render_qr_code(str(unique_id), image_format, size), content_type=QR_CONTENT_TYPES[image_format]
+        )
+    # The same URL always renders the same image
+    response['ETag'] = etag
+    response['Cache-Control'] = QR_CACHE_CONTROL
+    return response
@@ -12,6 +12,7 @@ const AdminVehicles = () => {
   const [filteredVehicles, setFilteredVehicles] = useState([]);
   const [searchTerm, setSearchTerm] = useState('');
   const [loading, setLoading] = useState(true);
+  const [nextPage, setNextPage] = useState(null);
   const navigate = useNavigate();
 
   useEffect(() => {
@@ -34,16 +35,18 @@ const AdminVehicles = () => {
     }
   }, [searchTerm, vehicles]);
 
-  const fetchVehicles = async () => {
+  // Fetch one page of vehicles; pass the 'next' cursor URL to append the following page
+  const fetchVehicles = async (pageUrl = null) => {
     try {
       const token = localStorage.getItem('admin_access_token');
-      const response = await api.get('/admin/vehicles/', {
+      const response = await api.get(pageUrl || '/admin/vehicles/', {
         headers: {
           'Authorization': `Bearer ${token}`
         }
       });
-      setVehicles(response.data.vehicles || []);
-      setFilteredVehicles(response.data.vehicles || []);
+      const page = response.data.vehicles || [];
+      setVehicles(prev => (pageUrl ? [...prev, ...page] : page));
+      setNextPage(response.data.next);
     } catch (error) {
       console.error('Error fetching vehicles:', error);
       if (error.response?.status === 401 || error.response?.status === 403) {
@@ -242,6 +245,14 @@ const AdminVehicles = () => {
             </table>
           </div>
         )}
+
+        {nextPage && (
+          <div className="load-more">
+            <button onClick={() => fetchVehicles(nextPage)} className="admin-logout-btn">
+              Load more
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -76,14 +76,14 @@ const Dashboard = () => {
 
       // Handle expiries response
       if (expiriesRes.status === 'fulfilled') {
-        setExpiries(expiriesRes.value.data);
+        setExpiries(expiriesRes.value.data.results || []);
       } else {
         setExpiries([]);
       }
 
       // Handle vehicles response
       if (vehiclesRes.status === 'fulfilled') {
-        setMyVehicles(vehiclesRes.value.data);
+        setMyVehicles(vehiclesRes.value.data.results || []);
       } else {
         setMyVehicles([]);
       }
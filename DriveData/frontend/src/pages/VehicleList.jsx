@@ -32,14 +32,8 @@ const VehicleList = () => {
     try {
       setLoading(true);
       setSearched(true);
-      const response = await vehicleAPI.getAllVehicles();
-      
-      // Filter vehicles by registration number
-      const filtered = (response.data || []).filter(vehicle =>
-        vehicle.registration_number.toLowerCase().includes(searchTerm.toLowerCase())
-      );
-      
-      setVehicles(filtered);
+      const response = await vehicleAPI.searchVehicles(searchTerm.trim());
+      setVehicles(response.data || []);
     } catch (err) {
       console.error('Error searching vehicles:', err);
       setVehicles([]);
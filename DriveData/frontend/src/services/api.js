@@ -88,6 +88,10 @@ export const vehicleAPI = {
   // Get all vehicles
   getAllVehicles: () => api.get('/vehicles/'),
   
+  // Search registry by registration number (server-side, prefix match)
+  searchVehicles: (query, match = 'prefix') =>
+    api.get('/vehicles/search/', { params: { q: query, match } }),
+  
   // Get single vehicle
   getVehicle: (id) => api.get(`/vehicles/${id}/`),
   